@@ -0,0 +1,179 @@
+import asyncio
+import math
+import os
+import time
+from fastapi.responses import JSONResponse
+from app.metrics import ADMISSION_REQUESTS, ADMISSION_WAIT_SECONDS
+
+
+# Toplu tahmin uç noktaları için kabul denetimi (admission control) ve geri basınç.
+# İstekler gövde boyutuna (Content-Length) göre iki sınıfa ayrılır: küçük (etkileşimli) ve büyük (toplu).
+# Her sınıfın kendi eşzamanlılık sınırı ve sınırlı bekleme kuyruğu vardır; böylece büyük işler servisi
+# doyursa bile küçük istekler kendi slotlarında beklemeden çalışır.
+#   - Slot boşsa istek hemen çalışır, doluysa kuyrukta bekler
+#   - Kuyruk doluysa istek beklemeden 429 ile reddedilir (Retry-After: kuyruğun boşalma tahmini)
+#   - Kuyrukta queue_timeout saniyeden fazla bekleyen istek 503 ile döner
+#   - max_bytes'tan büyük gövde okunmadan 413 ile reddedilir. Content-Length'i olmayan (chunked) gövde toplu
+#     sınıfa girer ve slot alındıktan sonra sayılarak okunur; sınırı aştığı anda 413 ile kesilir
+# Denetim saf ASGI katmanında yapılır: reddedilen isteğin gövdesi hiç okunup ayrıştırılmaz ve slot,
+# akış (streaming) yanıtın son baytı gönderilene kadar tutulur. Sınırlar her worker sürecine ayrıdır.
+
+
+class AdmissionLimiter:
+    def __init__(self, app_name, name, max_concurrent, max_queue, queue_timeout):
+        self.app_name = app_name        # /metrics'teki app etiketi
+        self.name = name                # İstek sınıfı (interactive / bulk)
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.waiting = 0
+        self.service_seconds = 0.1          # Bir isteğin slotu tutma süresi (üssel hareketli ortalama)
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def retry_after(self):
+        # Kuyruktakiler ve yeni istek için tahmini bekleme (saniye, en az 1)
+        return max(1, math.ceil(self.service_seconds * (self.waiting + 1) / self.max_concurrent))
+
+    async def acquire(self):
+        # Kabul edilirse None, edilmezse (HTTP durum kodu, açıklama) döner
+        started = time.perf_counter()
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()     # Boş slot: askıya alınmadan hemen alınır
+        elif self.waiting >= self.max_queue:
+            self.rejected += 1
+            return 429, "Kuyruk dolu, daha sonra tekrar deneyin."
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                return 503, f"Sunucu yoğun, {self.queue_timeout:g} saniye içinde sıra gelmedi."
+            finally:
+                self.waiting -= 1
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, app=self.app_name, endpoint_class=self.name)
+        self.in_flight += 1
+        self.admitted += 1
+        return None
+
+    def release(self, held_seconds):
+        self.in_flight -= 1
+        self.service_seconds = 0.8 * self.service_seconds + 0.2 * held_seconds
+        self._semaphore.release()
+
+    def stats(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_429": self.rejected,
+            "timed_out_503": self.timed_out,
+            "avg_service_seconds": round(self.service_seconds, 4)
+        }
+
+
+def replay(messages, receive):
+    # Önceden okunmuş gövde mesajlarını sırayla, bitince asıl receive'i döndüren ASGI receive
+    async def replay_receive():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+    return replay_receive
+
+
+class AdmissionControl:
+    # Yalnızca paths'teki istekleri denetleyen ASGI ara katmanı
+    def __init__(self, app, paths, limiters, interactive_max_bytes, max_bytes):
+        self.app = app
+        self.paths = set(paths)
+        self.limiters = limiters
+        self.interactive_max_bytes = interactive_max_bytes
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length")
+        size = int(length) if length is not None and length.isdigit() else None
+        limiter = self.limiters["interactive" if size is not None and size <= self.interactive_max_bytes else "bulk"]
+
+        if size is not None and size > self.max_bytes:
+            ADMISSION_REQUESTS.inc(app=limiter.app_name, endpoint_class=limiter.name, result="too_large")
+            await self.too_large(scope, receive, send)
+            return
+
+        rejection = await limiter.acquire()
+        if rejection is not None:
+            status, detail = rejection
+            ADMISSION_REQUESTS.inc(app=limiter.app_name, endpoint_class=limiter.name, result=str(status))
+            response = JSONResponse(status_code=status, content={"detail": detail},
+                                    headers={"Retry-After": str(limiter.retry_after())})
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            if size is None:
+                # Boyutu bilinmeyen (chunked) gövde slot alındıktan sonra en fazla max_bytes okunur; sınır aşılırsa
+                # gövdenin geri kalanı okunmadan 413 döner, aşılmazsa okunan mesajlar uygulamaya aynen verilir
+                messages = await self.read_body(receive)
+                if messages is None:
+                    ADMISSION_REQUESTS.inc(app=limiter.app_name, endpoint_class=limiter.name, result="too_large")
+                    await self.too_large(scope, receive, send)
+                    return
+                receive = replay(messages, receive)
+            ADMISSION_REQUESTS.inc(app=limiter.app_name, endpoint_class=limiter.name, result="admitted")
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - started)
+
+    async def read_body(self, receive):
+        # Gövde mesajları; toplam bayt max_bytes'ı aşarsa None
+        messages, received = [], 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":       # İstemci bağlantıyı kapattı
+                return messages
+            received += len(message.get("body", b""))
+            if received > self.max_bytes:
+                return None
+            if not message.get("more_body", False):
+                return messages
+
+    async def too_large(self, scope, receive, send):
+        response = JSONResponse(status_code=413, content={"detail": f"Gövde en fazla {self.max_bytes} bayt olabilir."})
+        await response(scope, receive, send)
+
+
+def install_admission_control(app, app_name, paths):
+    # Ortam değişkenleriyle ayarlanan sınırlarla ara katmanı ve GET /admin/admission uç noktasını ekler
+    queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+    limiters = {
+        "interactive": AdmissionLimiter(app_name, "interactive",
+                                        max_concurrent=int(os.getenv("ADMISSION_INTERACTIVE_CONCURRENCY", "32")),
+                                        max_queue=int(os.getenv("ADMISSION_INTERACTIVE_QUEUE", "128")),
+                                        queue_timeout=queue_timeout),
+        "bulk": AdmissionLimiter(app_name, "bulk",
+                                 max_concurrent=int(os.getenv("ADMISSION_BULK_CONCURRENCY", "2")),
+                                 max_queue=int(os.getenv("ADMISSION_BULK_QUEUE", "4")),
+                                 queue_timeout=queue_timeout)
+    }
+    app.add_middleware(AdmissionControl, paths=paths, limiters=limiters,
+                       interactive_max_bytes=int(os.getenv("ADMISSION_INTERACTIVE_MAX_BYTES", "65536")),
+                       max_bytes=int(os.getenv("PREDICT_BATCH_MAX_BYTES", str(64 * 1024 * 1024))))
+
+    @app.get("/admin/admission", tags=["Yönetim"])
+    async def admission_stats():
+        return {name: limiter.stats() for name, limiter in limiters.items()}
+
+    return limiters
@@ -0,0 +1,152 @@
+import argparse
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from app.train_model import engine, load_monthly_sales
+from app.streaming import stream_monthly_sales
+from app.database import bulk_insert
+from app.model_registry import file_version
+
+
+# Tüm ürün kataloğu için gelecek aylara toplu tahmin (API'ye ürün × ay başına istek atmadan):
+#   1) Aylık ürün satışları train_model.py ile aynı şekilde hesaplanır (load_monthly_sales / stream_monthly_sales)
+#   2) Her ürünün son 3 satış ayı, son birim fiyatı ve kodu bir kez çıkarılır
+#   3) Ufuk boyunca her ay için tüm ürünlerin özellik matrisi tek seferde kurulur ve sales_model.pkl ile
+#      vektörel tahmin edilir; tahmin edilen ay bir sonraki ayın prev_month_sales / sales_rolling_3 gecikmesi olur
+#   4) Sonuçlar sales_forecasts tablosuna COPY ile yazılır (aynı aylara ait eski tahminler aynı işlemde silinir)
+#
+# Kullanım: python -m app.bulk_forecast [--horizon 12] [--start 1998-06] [--dry-run]
+
+# sales_model.pkl'nin eğitildiği kolon sırası (train_model.py)
+MODEL_COLUMNS = ['order_month_num', 'product_code', 'unit_price', 'month_only', 'prev_month_sales', 'sales_rolling_3']
+
+FORECASTS_TABLE = "sales_forecasts"
+FORECASTS_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {FORECASTS_TABLE} (
+        product_id INTEGER NOT NULL,
+        product_name VARCHAR(40) NOT NULL,
+        forecast_month DATE NOT NULL,
+        horizon SMALLINT NOT NULL,
+        predicted_quantity DOUBLE PRECISION NOT NULL,
+        prev_month_sales DOUBLE PRECISION NOT NULL,
+        sales_rolling_3 DOUBLE PRECISION NOT NULL,
+        model_version VARCHAR(14) NOT NULL,
+        PRIMARY KEY (product_id, forecast_month)
+    )
+"""
+
+
+def latest_state(monthly_sales, product_code_map):
+    # Ürün başına tahmine başlangıç durumu: son 3 satış ayının miktarı (sağa yaslı, eksikler NaN),
+    # son ayın ortalama birim fiyatı ve eğitimdeki ürün kodu. Eğitimde olmayan ürünler atlanır.
+    df = monthly_sales[monthly_sales['product_name'].isin(product_code_map.keys())]
+    df = df.sort_values(['product_name', 'order_month'])
+    tail = df.groupby('product_name').tail(3)
+    last = tail.groupby('product_name').tail(1).reset_index(drop=True)
+
+    row = pd.Index(last['product_name']).get_indexer(tail['product_name'])
+    col = 2 - tail.groupby('product_name').cumcount(ascending=False).to_numpy()   # son ay → 2. kolon
+    window = np.full((len(last), 3), np.nan)
+    window[row, col] = tail['total_quantity'].to_numpy(dtype=np.float64)
+
+    return {
+        "product_id": last['product_id'].to_numpy(),
+        "product_name": last['product_name'].to_numpy(),
+        "product_code": last['product_name'].map(product_code_map).to_numpy(),
+        "unit_price": last['unit_price'].to_numpy(dtype=np.float64),
+        "window": window,
+        "last_month": pd.Period(df['order_month'].max(), freq='M')
+    }
+
+
+def forecast(model, state, start_month, horizon):
+    # Ufuktaki her ay için tüm ürünler tek model.predict çağrısında tahmin edilir (ay başına 1 çağrı)
+    window = state["window"].copy()
+    n_products = len(window)
+    frames = []
+    for step in range(horizon):
+        month = start_month + step
+        # Eğitimdeki tanımla aynı: önceki satış ayı ve önceki (en fazla) 3 satış ayının ortalaması
+        prev_month_sales = np.nan_to_num(window[:, -1])
+        sales_rolling_3 = np.nan_to_num(np.nanmean(window, axis=1))
+        X = pd.DataFrame({
+            'order_month_num': np.full(n_products, month.year * 100 + month.month),
+            'product_code': state["product_code"],
+            'unit_price': state["unit_price"],
+            'month_only': np.full(n_products, month.month),
+            'prev_month_sales': prev_month_sales,
+            'sales_rolling_3': sales_rolling_3
+        }, columns=MODEL_COLUMNS)
+        predicted = model.predict(X).clip(min=0)     # Negatif satış miktarı tahmini 0 kabul edilir
+
+        frames.append(pd.DataFrame({
+            "product_id": state["product_id"],
+            "product_name": state["product_name"],
+            "forecast_month": month.start_time.date(),
+            "horizon": step + 1,
+            "predicted_quantity": predicted.round(2),
+            "prev_month_sales": prev_month_sales,
+            "sales_rolling_3": sales_rolling_3.round(2)
+        }))
+        # Tahmin edilen ay, sonraki ayın gecikme penceresine satış ayı olarak eklenir
+        window = np.column_stack([window[:, 1:], predicted])
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_forecasts(forecasts):
+    # Aynı ay aralığındaki önceki tahminler silinip yenileri COPY ile yazılır (tek işlem).
+    # Aralık yarı açıktır: [ilk ay, son aydan sonraki ay)
+    months = forecasts['forecast_month']
+    bulk_insert(engine, FORECASTS_TABLE, forecasts, pre_statements=[
+        (FORECASTS_DDL, None),
+        (f"DELETE FROM {FORECASTS_TABLE} WHERE forecast_month >= %(start)s AND forecast_month < %(end)s",
+         {"start": months.min(), "end": (pd.Period(months.max(), freq='M') + 1).start_time.date()})
+    ])
+
+
+def run(horizon=12, start=None, chunksize=None, dry_run=False, model_path="sales_model.pkl"):
+    if chunksize is None:
+        chunksize = int(os.getenv("TRAIN_CHUNKSIZE", "0"))
+
+    started = time.perf_counter()
+    model = joblib.load(model_path)
+    product_code_map = joblib.load("product_code_map.pkl")
+    monthly_sales = stream_monthly_sales(engine, chunksize=chunksize) if chunksize > 0 else load_monthly_sales()
+    state = latest_state(monthly_sales, product_code_map)
+    loaded = time.perf_counter()
+
+    # Varsayılan başlangıç: verideki son satış ayından sonraki ay. Gecikme penceresi en son satışlardan kurulduğu
+    # için daha önceki bir ay, kendisinden sonraki satışlarla tahmin edilmiş olurdu; bu yüzden reddedilir
+    start_month = pd.Period(start, freq='M') if start else state["last_month"] + 1
+    if start_month <= state["last_month"]:
+        raise ValueError(f"Başlangıç ayı ({start_month}) son satış ayından ({state['last_month']}) sonra olmalı; "
+                         f"en erken {state['last_month'] + 1}.")
+    forecasts = forecast(model, state, start_month, horizon)
+    forecasts["model_version"] = file_version(model_path)
+    scored = time.perf_counter()
+
+    if not dry_run:
+        write_forecasts(forecasts)
+    written = time.perf_counter()
+
+    print(f"{len(state['product_id'])} ürün × {horizon} ay = {len(forecasts)} tahmin "
+          f"({start_month} - {start_month + horizon - 1})")
+    print(f"Veri: {loaded - started:.2f} sn, tahmin: {scored - loaded:.2f} sn, "
+          f"yazma: {written - scored:.2f} sn{' (dry-run)' if dry_run else ''}")
+    return forecasts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tüm ürünler için gelecek ayların satış tahmini")
+    parser.add_argument("--horizon", type=int, default=int(os.getenv("FORECAST_HORIZON", "12")),
+                        help="Tahmin edilecek ay sayısı")
+    parser.add_argument("--start", help="İlk tahmin ayı (YYYY-MM, son satış ayından sonra olmalı; "
+                                        "varsayılan: son satış ayından sonraki ay)")
+    parser.add_argument("--dry-run", action="store_true", help="Veritabanına yazmadan yalnızca hesapla")
+    args = parser.parse_args()
+    try:
+        run(horizon=args.horizon, start=args.start, dry_run=args.dry_run)
+    except ValueError as e:
+        parser.error(str(e))
@@ -0,0 +1,82 @@
+import io
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+
+# /predict/batch/columnar için kolon tabanlı giriş/çıkış biçimleri. Gövde satır satır nesneye
+# dönüştürülmeden doğrudan pandas kolonlarına (NumPy dizilerine) okunur, sonuç da aynı şekilde yazılır.
+
+# İçerik türü (Content-Type / Accept) → biçim adı
+MEDIA_TYPES = {
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+}
+# Biçim adı → yanıtta kullanılan içerik türü
+FORMAT_MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+INPUT_COLUMNS = ["product_id", "unit_price", "quantity", "order_date"]
+
+
+def media_format(header_value):
+    # "text/csv; charset=utf-8" ya da "application/x-ndjson, */*" gibi başlık değerinden ilk tanınan biçimi bulur
+    for part in (header_value or "").split(","):
+        fmt = MEDIA_TYPES.get(part.split(";")[0].strip().lower())
+        if fmt:
+            return fmt
+    return None
+
+
+def read_table(body, fmt):
+    # Gövdeyi biçimine göre DataFrame'e okur ve gerekli kolonların varlığını kontrol eder (eksikse ValueError)
+    if fmt == "arrow":
+        df = pa.ipc.open_stream(body).read_all().to_pandas()
+    elif fmt == "parquet":
+        df = pd.read_parquet(io.BytesIO(body))
+    elif fmt == "csv":
+        df = pd.read_csv(io.BytesIO(body), dtype={"order_date": str})
+    elif fmt == "ndjson":
+        df = pd.read_json(io.BytesIO(body), lines=True, dtype={"order_date": str}, convert_dates=False)
+    else:
+        raise ValueError(f"Desteklenmeyen biçim: {fmt}")
+
+    missing = [column for column in INPUT_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Eksik kolon(lar): {', '.join(missing)}")
+    if df[INPUT_COLUMNS].isna().any().any():
+        raise ValueError("Kolonlarda boş değer var.")
+    return df
+
+
+def write_table(df, fmt):
+    # Sonuç DataFrame'ini istenen biçimde bayt dizisine yazar
+    if fmt == "arrow":
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    if fmt == "parquet":
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+    if fmt == "csv":
+        return df.to_csv(index=False).encode()
+    if fmt == "ndjson":
+        return ndjson_lines(df)
+    raise ValueError(f"Desteklenmeyen biçim: {fmt}")
+
+
+def ndjson_lines(df):
+    # Her satır bir JSON nesnesi (akış yanıtında parça parça gönderilir)
+    if df.empty:
+        return b""
+    return df.to_json(orient="records", lines=True, date_format="iso").encode()
@@ -0,0 +1,75 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine   # Asenkron (asyncpg) bağlantı havuzu için
+import io
+import os
+import time
+from app.metrics import DB_POOL_WAIT_SECONDS
+
+
+# Senkron sürücü önekleri asenkron karşılıklarına çevrilir (psycopg2 → asyncpg)
+ASYNC_DRIVERS = {
+    "postgresql+psycopg2://": "postgresql+asyncpg://",
+    "postgresql://": "postgresql+asyncpg://",
+    "postgres://": "postgresql+asyncpg://",
+}
+
+
+def async_database_url(database_url):
+    # ASYNC_DATABASE_URL tanımlıysa doğrudan o kullanılır, yoksa DATABASE_URL asyncpg'ye çevrilir
+    override = os.getenv("ASYNC_DATABASE_URL")
+    if override:
+        return override
+    for sync_prefix, async_prefix in ASYNC_DRIVERS.items():
+        if database_url.startswith(sync_prefix):
+            return async_prefix + database_url[len(sync_prefix):]
+    return database_url
+
+
+def create_async_db_engine(database_url):
+    # Havuz boyutu ortam değişkenleriyle ayarlanır:
+    #   DB_POOL_SIZE     → sürekli açık tutulan bağlantı sayısı
+    #   DB_MAX_OVERFLOW  → yoğunlukta havuzun üstüne açılabilecek ek bağlantı sayısı
+    #   DB_POOL_TIMEOUT  → boş bağlantı için en fazla kaç saniye beklenecek
+    #   DB_STATEMENT_CACHE_SIZE → bağlantı başına saklanan hazırlanmış sorgu (prepared statement) sayısı;
+    #                             PgBouncer'ın transaction modunda 0 verilmelidir
+    return create_async_engine(
+        async_database_url(database_url),
+        pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_pre_ping=True,
+        connect_args={"prepared_statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))}
+    )
+
+
+async def fetch_all(async_engine, query, params=None):
+    # Sorguyu havuzdan alınan bir bağlantıda çalıştırır, satırları sözlük listesi olarak döndürür.
+    # Bağlantı beklerken olay döngüsü serbest kalır, böylece farklı isteklerin sorguları üst üste biner.
+    started = time.perf_counter()
+    async with async_engine.connect() as conn:
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)   # Havuzdan bağlantı alma süresi
+        result = await conn.execute(text(query), params or {})
+        return [dict(row) for row in result.mappings().all()]
+
+
+def bulk_insert(engine, table, df, pre_statements=()):
+    # psycopg2 varsa COPY ile, yoksa çok satırlı INSERT ile yükler.
+    # pre_statements (ör. aynı aralıktaki eski kayıtları silen DELETE) yüklemeyle aynı işlemde çalıştırılır.
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if hasattr(cursor, "copy_expert"):
+            for statement, params in pre_statements:
+                cursor.execute(statement, params)
+            buffer = io.StringIO()
+            df.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH CSV", buffer)
+            raw.commit()
+            return
+    finally:
+        raw.close()
+    with engine.begin() as conn:
+        for statement, params in pre_statements:
+            conn.exec_driver_sql(statement, params)
+        df.to_sql(table, conn, if_exists="append", index=False, method="multi", chunksize=5000)
@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from app.queries import PRODUCT_LATEST_ORDER_QUERY, PRODUCTS_LATEST_ORDER_QUERY, PRODUCT_NAME_QUERY, SINCE_FILTER
+from app.feature_store import ORDER_LINES_QUERY
+from app.randomforest_sales import DATA_QUERY
+
+
+# Sıcak sorguları destekleyen indekslerin kurulumu ve EXPLAIN ile kontrolü:
+#   1) INDEXES listesindeki indeksler yoksa CREATE INDEX CONCURRENTLY ile oluşturulur (tabloyu yazmaya kilitlemez),
+#      ardından ilgili tablolar ANALYZE edilir. Komut tekrar çalıştırılabilir (IF NOT EXISTS).
+#   2) HOT_QUERIES'teki her sorgunun planı EXPLAIN (FORMAT JSON) ile alınır ve sipariş hacmiyle büyüyen
+#      tabloları (LARGE_TABLES) baştan sona tarayan sorgular raporlanır. Küçük tablolarda sıralı tarama zaten
+#      en ucuz plan olduğundan kontrol enable_seqscan = off ile yapılır; bu durumda planlayıcı sıralı tarama
+#      yerine koşulsuz (Index Cond'suz) tam indeks taraması seçebildiği için ikisi de tam tarama sayılır.
+#      LIMIT altında sıralı indeks yürüyüşü (ör. en son sipariş) ilk eşleşmede durduğundan sayılmaz.
+#
+# Kullanım: python -m app.db_indexes [--check-only]   (tam tarama kalırsa çıkış kodu 1)
+
+INDEXES = [
+    # Ürün → sipariş satırları (main.py, main_many_sales.py ürün sorguları)
+    ("order_details_product_order_idx", "order_details", "(product_id, order_id)"),
+    # Sipariş → tarih ve müşteri: en son siparişi bulurken tablo satırına gitmeden (index-only) okunur
+    ("orders_order_date_covering_idx", "orders", "(order_id, order_date) INCLUDE (customer_id)"),
+    # Artımlı yenilemelerdeki order_date >= :since aralık filtresi
+    ("orders_order_date_idx", "orders", "(order_date)"),
+]
+
+# Sipariş sayısıyla büyüyen tablolar; products ve customers küçük boyut tabloları olduğundan hash join için
+# tamamen okunmaları sorun değildir
+LARGE_TABLES = ("orders", "order_details")
+
+# Sorgu adı → (sorgu, örnek parametreler). Planın biçimi parametre değerlerine değil indekslere bağlıdır.
+HOT_QUERIES = {
+    "main.load_product_info": (PRODUCT_LATEST_ORDER_QUERY, {"product_id": 1}),
+    "main_many_sales.lookup_products": (PRODUCTS_LATEST_ORDER_QUERY, {"product_ids": [1, 2, 3]}),
+    "mainold.load_product_name": (PRODUCT_NAME_QUERY, {"product_id": 1}),
+    "feature_store.refresh": (ORDER_LINES_QUERY + SINCE_FILTER, {"since": "1998-04-01"}),
+    "feature_cache.update": (DATA_QUERY + SINCE_FILTER, {"since": "1998-04-01"}),
+}
+
+
+def create_indexes(engine, concurrently=True):
+    # CONCURRENTLY işlem bloğu içinde çalışamadığından bağlantı autocommit kipinde açılır
+    option = "CONCURRENTLY " if concurrently else ""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, table, columns in INDEXES:
+            conn.execute(text(f"CREATE INDEX {option}IF NOT EXISTS {name} ON {table} {columns}"))
+        for table in sorted({table for _, table, _ in INDEXES}):
+            conn.execute(text(f"ANALYZE {table}"))
+    return [name for name, _, _ in INDEXES]
+
+
+def full_scans(plan, limited=False):
+    # Plan ağacında büyük tabloları baştan sona tarayan düğümler ("orders: Seq Scan" biçiminde).
+    # limited: düğüm, arada tüm girdiyi tüketen (Sort, Hash, Aggregate) bir düğüm olmadan LIMIT altında mı
+    node = plan["Node Type"]
+    if node == "Limit":
+        limited = True
+    elif node in ("Sort", "Hash", "Aggregate"):
+        limited = False
+
+    found = []
+    if plan.get("Relation Name") in LARGE_TABLES:
+        unbounded_index = node in ("Index Scan", "Index Only Scan") and "Index Cond" not in plan and not limited
+        if node == "Seq Scan" or unbounded_index:
+            found.append(f"{plan['Relation Name']}: {node}")
+    for child in plan.get("Plans", []):
+        found += full_scans(child, limited)
+    return found
+
+
+def explain_hot_queries(engine, queries=None):
+    # Sorgu adı → planda tam taranan büyük tablolar (boş liste = hepsine indeks koşuluyla erişiliyor)
+    results = {}
+    with engine.connect() as conn:
+        for name, (query, params) in (queries or HOT_QUERIES).items():
+            with conn.begin():
+                conn.execute(text("SET LOCAL enable_seqscan = off"))
+                plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + query), params).scalar()
+            results[name] = full_scans(plan[0]["Plan"])
+    return results
+
+
+def report(results):
+    # Sonuçları yazdırır; tam tarama kalan sorgu yoksa True döner
+    for name, scans in results.items():
+        print(f"{name:34s} {'TAM TARAMA → ' + ', '.join(scans) if scans else 'indeks'}")
+    return not any(results.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sıcak sorgular için indeksleri kurar ve planlarını kontrol eder")
+    parser.add_argument("--check-only", action="store_true", help="İndeks oluşturmadan yalnızca EXPLAIN kontrolü")
+    parser.add_argument("--no-concurrently", action="store_true",
+                        help="İndeksleri CONCURRENTLY olmadan (daha hızlı, tabloyu yazmaya kilitleyerek) oluştur")
+    args = parser.parse_args()
+
+    load_dotenv()
+    engine = create_engine(os.getenv("DATABASE_URL"))
+    if not args.check_only:
+        print("İndeksler:", ", ".join(create_indexes(engine, concurrently=not args.no_concurrently)))
+    sys.exit(0 if report(explain_hot_queries(engine)) else 1)
@@ -0,0 +1,92 @@
+import json
+import os
+import pandas as pd
+from sqlalchemy import text
+from app.features import line_columns
+from app.streaming import iter_chunks
+from app.queries import SINCE_FILTER
+
+
+# Artımlı eğitim için sipariş satırı kolonlarının (features.line_columns) diskteki önbelleği.
+# Satırlar sipariş ayına göre ayrı Parquet dosyalarında (ör. 1997-03.parquet) tutulur; manifest.json
+# eğitime girmiş en son sipariş tarihini (watermark) ve her ayın satır sayısını saklar. update() yalnızca
+# watermark ayının başından itibaren gelen siparişleri okur, o ayı ve sonraki ayları yeniden yazar
+# (feature_store.MonthlySalesStore.refresh ile aynı mantık). Böylece gece eğitimleri tüm geçmişi
+# veritabanından yeniden çekmez ve tarih ayrıştırması yalnızca yeni satırlar için yapılır.
+# Tarihi olmayan siparişler hiçbir aya ait olmadığı için önbelleğe alınmaz.
+class LineFeatureCache:
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.manifest = {"watermark": None, "months": {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+
+    @property
+    def watermark(self):
+        return self.manifest["watermark"]
+
+    def _path(self, month):
+        return os.path.join(self.directory, f"{month}.parquet")
+
+    def _fetch(self, engine, query, chunksize, since):
+        params = {}
+        if since is not None:
+            query += SINCE_FILTER
+            params["since"] = since
+        if chunksize > 0:
+            chunks = iter_chunks(engine, query, chunksize, params=params)
+        else:
+            chunks = [pd.read_sql(text(query), engine, params=params)]
+
+        parts = []
+        for chunk in chunks:
+            chunk = chunk[chunk["order_date"].notna().to_numpy()]
+            lines = line_columns(chunk)
+            lines["order_month"] = pd.to_datetime(chunk["order_date"]).dt.strftime("%Y-%m").to_numpy()
+            lines["order_date"] = pd.to_datetime(chunk["order_date"]).to_numpy()
+            parts.append(lines)
+        return pd.concat(parts, ignore_index=True) if parts else None
+
+    def update(self, engine, query, chunksize=0):
+        # Yeni siparişleri okuyup etkilenen ayların dosyalarını yeniden yazar; manifest yalnızca bellekte
+        # güncellenir (diske commit() yazar). Dönüş: satır sayısı değişen (yeni ya da güncellenen) ayların listesi
+        since = None
+        if self.watermark is not None:
+            since = pd.Timestamp(self.watermark).to_period("M").start_time.date()
+        lines = self._fetch(engine, query, chunksize, since)
+        if lines is None or lines.empty:
+            return []
+
+        os.makedirs(self.directory, exist_ok=True)
+        changed = []
+        for month, group in lines.groupby("order_month"):
+            rows = len(group)
+            if self.manifest["months"].get(month) != rows:
+                changed.append(month)
+            tmp_path = self._path(month) + ".tmp"
+            group.drop(columns=["order_month", "order_date"]).to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self._path(month))
+            self.manifest["months"][month] = rows
+
+        latest = lines["order_date"].max()
+        if self.watermark is None or latest > pd.Timestamp(self.watermark):
+            self.manifest["watermark"] = latest.isoformat()
+        return sorted(changed)
+
+    def commit(self):
+        # update()'in manifest değişikliklerini (watermark, ay satır sayıları) diske yazar. Eğitim başarıyla
+        # kaydedildikten sonra çağrılır: eğitim yarıda kalırsa (ör. bellek yetmezse) diskteki manifest eski
+        # kalır ve sonraki update() aynı ayları yine yeni/değişen olarak döndürür. Yazılmış ay dosyaları
+        # zararsızdır; eski watermark ayından itibaren hepsi yeniden okunup yazılır.
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def load(self):
+        # Tüm ayların kolonlarını (bellek eşlemeli Parquet okuma ile) tek tabloda birleştirir
+        frames = [pd.read_parquet(self._path(month), memory_map=True) for month in sorted(self.manifest["months"])]
+        return pd.concat(frames, ignore_index=True)
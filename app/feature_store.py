@@ -0,0 +1,145 @@
+import threading                                # Arka planda periyodik yenileme ve güvenli güncelleme için
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from app.queries import SINCE_FILTER
+
+
+# Sipariş satırlarını (ürün, tarih, miktar, fiyat) çeken sorgu.
+# since verilirse yalnızca o tarihten sonraki siparişler gelir (artımlı yenileme için).
+ORDER_LINES_QUERY = """
+    SELECT od.product_id, p.product_name, o.order_date, od.quantity, p.unit_price
+    FROM order_details od
+    JOIN orders o ON od.order_id = o.order_id
+    JOIN products p ON od.product_id = p.product_id
+"""
+
+
+def month_index(year, month):
+    # Yıl/ay bilgisini ardışık bir tam sayıya çevirir (ör. 1997-01 ile 1996-12 arası fark 1 olur)
+    return int(year) * 12 + int(month) - 1
+
+
+def compute_monthly_sales(merged):
+    # Eğitimde kullanılan aylık ürün satış tablosu (train_model.py ile aynı toplama).
+    # Girdi: product_id, product_name, order_date, quantity, unit_price kolonlarını içeren satırlar
+    merged = merged.dropna(subset=['order_date', 'quantity', 'unit_price'])
+    merged = merged.assign(order_month=pd.to_datetime(merged['order_date']).dt.to_period('M').astype(str))
+
+    monthly_sales = merged.groupby(['product_id', 'product_name', 'order_month']).agg({
+        'quantity': 'sum',
+        'unit_price': 'mean'
+    }).reset_index().rename(columns={'quantity': 'total_quantity'})
+    return monthly_sales
+
+
+def lag_arrays(months, quantities):
+    # Bir ürünün satış olan ayları (sıralı) ve miktarları verildiğinde, ilk aydan son aydan bir sonrakine
+    # kadar her takvim ayı için eğitimdeki gecikme özelliklerini hesaplar:
+    #   prev_month_sales → o aydan önceki son satış ayının miktarı   (groupby().shift(1))
+    #   sales_rolling_3  → o aydan önceki son 3 satış ayının ortalaması (rolling(3).mean().shift(1))
+    # Eğitimde 3 aydan az geçmişi olan satırlar atılır; servis tarafında eldeki ayların ortalaması, hiç yoksa 0 kullanılır.
+    months = np.asarray(months, dtype=np.int64)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    calendar = np.arange(months[0], months[-1] + 2)
+    k = np.searchsorted(months, calendar, side='left')       # Her takvim ayından önceki satış ayı sayısı
+
+    cumsum = np.concatenate([[0.0], np.cumsum(quantities)])
+    start = np.maximum(k - 3, 0)
+    count = k - start
+    prev_sales = np.where(k > 0, quantities[np.maximum(k - 1, 0)], 0.0)
+    rolling_3 = np.divide(cumsum[k] - cumsum[start], count, out=np.zeros(len(k)), where=count > 0)
+    return int(months[0]), prev_sales, rolling_3
+
+
+# Ürün × ay satış özelliklerini bellekte tutan depo.
+# Başlangıçta tüm sipariş geçmişinden bir kez kurulur, sonra yalnızca son aydan itibaren gelen
+# siparişlerle artımlı olarak yenilenir. Tahmin sırasında gecikme özellikleri dizi indeksiyle (O(1)) okunur.
+class MonthlySalesStore:
+    def __init__(self, engine):
+        self.engine = engine
+        self._monthly = {}          # product_id → {ay indeksi: toplam miktar}
+        self._features = {}         # product_id → (ilk ay indeksi, prev_sales dizisi, rolling_3 dizisi)
+        self.watermark = None       # Depoya işlenmiş en son sipariş tarihi
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _load(self, since=None):
+        query = ORDER_LINES_QUERY
+        params = {}
+        if since is not None:
+            query += SINCE_FILTER
+            params["since"] = since
+        return pd.read_sql(text(query), self.engine, params=params)
+
+    def _apply(self, lines):
+        # Gelen satırlardan aylık toplamları hesaplar ve etkilenen ürünlerin dizilerini yeniden kurar
+        if lines.empty:
+            return 0
+        monthly_sales = compute_monthly_sales(lines)
+        periods = pd.PeriodIndex(monthly_sales['order_month'], freq='M')
+        monthly_sales['month_idx'] = periods.year * 12 + periods.month - 1
+
+        for product_id, group in monthly_sales.groupby('product_id'):
+            product_months = self._monthly.setdefault(int(product_id), {})
+            product_months.update(zip(group['month_idx'].astype(int), group['total_quantity'].astype(float)))
+            months = sorted(product_months)
+            self._features[int(product_id)] = lag_arrays(months, [product_months[m] for m in months])
+
+        latest = pd.to_datetime(lines['order_date']).max()
+        if self.watermark is None or latest > self.watermark:
+            self.watermark = latest
+        return len(monthly_sales)
+
+    def build(self):
+        with self._lock:
+            self._monthly = {}
+            self._features = {}
+            self.watermark = None
+            return self._apply(self._load())
+
+    def refresh(self):
+        # Son işlenen ayın başından itibaren siparişler yeniden toplanır; o ay ve sonrası üzerine yazılır
+        with self._lock:
+            if self.watermark is None:
+                return self._apply(self._load())
+            since = self.watermark.to_period('M').start_time.date()
+            return self._apply(self._load(since=since))
+
+    def lag_features(self, product_id, year, month):
+        # (prev_month_sales, sales_rolling_3) döndürür; ürünün geçmişi yoksa (0, 0)
+        entry = self._features.get(product_id)
+        if entry is None:
+            return 0.0, 0.0
+        first_month, prev_sales, rolling_3 = entry
+        i = month_index(year, month) - first_month
+        if i < 0:
+            return 0.0, 0.0
+        i = min(i, len(prev_sales) - 1)     # Son satış ayından sonraki tüm aylar aynı geçmişi görür
+        return float(prev_sales[i]), float(rolling_3[i])
+
+    def start_auto_refresh(self, interval_seconds):
+        # Belirtilen aralıklarla refresh() çağıran arka plan iş parçacığı başlatır (0 → kapalı)
+        if interval_seconds <= 0:
+            return None
+
+        def loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print("Özellik deposu yenilenemedi:", e)
+
+        thread = threading.Thread(target=loop, name="feature-store-refresh", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "products": len(self._features),
+            "product_months": sum(len(m) for m in self._monthly.values()),
+            "watermark": None if self.watermark is None else str(self.watermark.date())
+        }
@@ -0,0 +1,164 @@
+import sys
+import time
+import warnings
+import numpy as np
+import pandas as pd
+
+
+# Eğitim (randomforest_sales.create_features) ve toplu tahmin (main_many_sales.predict_batch) tarafından
+# ortak kullanılan, satır başına Python çağrısı yapmayan (vektörel) özellik fonksiyonları.
+
+# Ay → mevsim tablosu (indeks = ay numarası; 0 kullanılmaz)
+# 1 = İlkbahar (3-5), 2 = Yaz (6-8), 3 = Sonbahar (9-11), 4 = Kış (12-2)
+SEASON_BY_MONTH = np.array([0, 4, 4, 1, 1, 1, 2, 2, 2, 3, 3, 3, 4], dtype=np.int8)
+
+# Random Forest modelinin beklediği kolon sırası
+FEATURE_COLUMNS = [
+    "month", "year", "day_of_week", "season",
+    "country_code", "product_code",
+    "quantity", "unit_price", "avg_price"
+]
+
+
+def season_of(month):
+    # Tek bir ay ya da ay dizisi için mevsim kodu (tablo araması)
+    return SEASON_BY_MONTH[month]
+
+
+def date_features(order_date):
+    # Tarih kolonundan ay, yıl, haftanın günü ve mevsim dizilerini küçük tam sayı tiplerinde üretir
+    order_date = pd.DatetimeIndex(order_date)
+    month = order_date.month.to_numpy().astype(np.int8)
+    return {
+        "month": month,
+        "year": order_date.year.to_numpy().astype(np.int16),
+        "day_of_week": order_date.dayofweek.to_numpy().astype(np.int8),
+        "season": SEASON_BY_MONTH[month]
+    }
+
+
+def naive_timestamp(value):
+    # Tek bir tarih metni; saat dilimi ofseti varsa atılır (yerel duvar saati korunur, ay/gün ofsetle kaymaz).
+    # Çözülemeyen değer için NaT döner
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)       # "dayfirst" uyarısı (ör. "13/02/1997")
+            timestamp = pd.Timestamp(pd.to_datetime(value))
+    except (ValueError, TypeError, OverflowError):
+        return pd.NaT
+    if timestamp is pd.NaT or timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.tz_localize(None)
+
+
+def naive_dates(values, **kwargs):
+    # pd.to_datetime (errors="coerce") sonucu saat dilimsiz ve mikrosaniye birimli; tek çağrıda çözülemeyen
+    # kolon (ör. ofsetli ve ofsetsiz tarihler karışık: pandas "Mixed timezones detected") tamamen NaT döner
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)       # "Could not infer format" uyarısı
+            dates = pd.to_datetime(values, errors="coerce", **kwargs)
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        return dates.dt.as_unit("us")
+    except (ValueError, TypeError):
+        return pd.Series(pd.NaT, index=values.index, dtype="datetime64[us]")
+
+
+def parse_dates(values):
+    # Tarih kolonunu saat dilimsiz datetime Series'e çevirir; çözülemeyen değerler NaT olur. Sırasıyla:
+    #   1) tüm kolon tek seferde ISO 8601 olarak,
+    #   2) kalanlar tek seferde pandas'ın ilk değerden çıkardığı biçimle (ör. hepsi "01/02/1997" biçiminde),
+    #   3) hâlâ kalanlar (karışık biçim / saat dilimi) naive_timestamp ile tek tek çözülür.
+    # Ofsetli tarihlerde yerel duvar saati korunur; sonuç eskiden satır satır pd.to_datetime ile bulunan ay/yıl/gün
+    # ile aynıdır
+    values = pd.Series(values)
+    dates = naive_dates(values, format="ISO8601")
+    missing = np.flatnonzero(dates.isna().to_numpy())
+    if len(missing):
+        dates.iloc[missing] = naive_dates(values.iloc[missing]).to_numpy()
+        missing = np.flatnonzero(dates.isna().to_numpy())
+    if len(missing):
+        parsed = pd.DatetimeIndex([naive_timestamp(value) for value in values.iloc[missing]])
+        dates.iloc[missing] = parsed.as_unit("us")
+    return dates
+
+
+def category_codes(values):
+    # pandas category kodları (sıralı benzersiz değerler, eksik değer → -1), int32 olarak
+    return values.astype("category").cat.codes.to_numpy().astype(np.int32)
+
+
+def encoder_table(values):
+    # category_codes ile aynı kodlamanın kalıcı tablosu: değer → kod (servis tarafında sözlük araması için)
+    categories = pd.Series(values).astype("category").cat.categories
+    return {value: code for code, value in enumerate(categories.tolist())}
+
+
+def line_columns(df):
+    # Sipariş satırlarının diğer satırlardan bağımsız kolonları: tarih parçaları, miktar, fiyat, satış ve
+    # kategorik adlar (ülke, ürün). Artımlı eğitimde (app/feature_cache.py) ay ay saklanan biçim budur.
+    # Eksik değerli satırlar da tutulur (complete=False): eğitime girmezler ama kod tabloları ve ortalama
+    # fiyat tüm satırlardan hesaplandığı için encode_lines'ta gereklidirler.
+    quantity = df["quantity"].to_numpy(dtype=np.float64)
+    unit_price = df["unit_price"].to_numpy(dtype=np.float64)
+    order_date = pd.to_datetime(df["order_date"])
+
+    lines = pd.DataFrame(date_features(order_date.fillna(pd.Timestamp(0))), index=df.index)
+    lines["quantity"] = quantity.astype(np.float32)
+    lines["unit_price"] = unit_price
+    lines["sales"] = np.nan_to_num(quantity * unit_price, nan=0.0).clip(min=0)   # Negatif / eksik satış → 0
+    lines["country"] = df["country"]
+    lines["product_name"] = df["product_name"]
+    lines["complete"] = df.notna().all(axis=1).to_numpy()
+    return lines
+
+
+def encode_lines(lines):
+    # line_columns çıktısından model özelliklerini üretir: kategorik kodlar ve ürün ortalama fiyatı tüm
+    # satırlara bakılarak hesaplanır, ardından eksik değer içeren satırlar atılır
+    features = lines[["month", "year", "day_of_week", "season"]].copy()
+    features["country_code"] = category_codes(lines["country"])
+    features["product_code"] = category_codes(lines["product_name"])
+    features["quantity"] = lines["quantity"].to_numpy(dtype=np.float32)
+    features["unit_price"] = lines["unit_price"].to_numpy(dtype=np.float32)
+    features["avg_price"] = (
+        lines["unit_price"].groupby(features["product_code"]).transform("mean").to_numpy().astype(np.float32)
+    )
+    features["sales"] = lines["sales"]
+    return features[lines["complete"].to_numpy()]
+
+
+def line_features(df):
+    # Sipariş satırlarından (order_date, quantity, unit_price, country, product_name) eğitim özelliklerini üretir
+    return encode_lines(line_columns(df))
+
+
+def synthetic_order_lines(n_rows, n_products=77, n_countries=21, seed=42):
+    # Benchmark için Northwind benzeri rastgele sipariş satırları
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("1996-07-04")
+    return pd.DataFrame({
+        "order_date": start + rng.integers(0, 670, n_rows).astype("timedelta64[D]"),
+        "product_id": rng.integers(1, n_products + 1, n_rows),
+        "quantity": rng.integers(1, 120, n_rows),
+        "unit_price": rng.uniform(2, 260, n_rows).round(2),
+        "country": pd.Categorical.from_codes(rng.integers(0, n_countries, n_rows),
+                                             [f"Country {i}" for i in range(n_countries)]).astype(object),
+        "product_name": pd.Categorical.from_codes(rng.integers(0, n_products, n_rows),
+                                                  [f"Product {i}" for i in range(n_products)]).astype(object)
+    })
+
+
+def benchmark(n_rows=10_000_000):
+    df = synthetic_order_lines(n_rows)
+    start = time.perf_counter()
+    features = line_features(df)
+    elapsed = time.perf_counter() - start
+    print(f"{n_rows:,} satır: {elapsed:.2f} sn ({n_rows / elapsed:,.0f} satır/sn), "
+          f"özellik belleği: {features.memory_usage(deep=True).sum() / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    # Kullanım: python -m app.features [satır sayısı]
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
@@ -0,0 +1,132 @@
+import sys
+import time
+import joblib
+import numpy as np
+from app.model_registry import atomic_dump
+
+
+# Eğitimli RandomForestRegressor'ı sklearn'ün ağaç nesnelerinden bağımsız, bitişik NumPy dizilerine
+# düzleştirir. Tüm ağaçların düğümleri tek dizilerde arka arkaya durur:
+#   feature   → düğümde bakılan özellik (yaprakta 0)
+#   threshold → bölme eşiği (X[feature] <= threshold ise sola gidilir)
+#   left/right→ çocuk düğüm indeksleri (yapraklarda düğümün kendisi; böylece yaprağa varan satır orada kalır)
+#   value     → yaprak tahmini
+# Tahmin, tüm ağaçlar × tüm satırlar için düğüm indekslerini derinlik kadar adımda birlikte ilerletir;
+# Python seviyesinde ağaç başına döngü ya da ara nesne oluşturma yoktur.
+class FlatForest:
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots              # Her ağacın kök düğümünün indeksi
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            idx = np.arange(n)
+            is_leaf = tree.children_left == -1
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            lefts.append(np.where(is_leaf, idx, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, idx, tree.children_right) + offset)
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth
+        )
+
+    def predict(self, X):
+        # sklearn ağaçları girdiyi float32'ye çevirerek karşılaştırır; birebir aynı sonuç için aynısı yapılır
+        X = np.asarray(X, dtype=np.float32)
+        n_samples = X.shape[0]
+        rows = np.arange(n_samples)
+
+        # nodes[t, i] → t. ağaçta i. satırın bulunduğu düğüm
+        nodes = np.repeat(self.roots[:, None], n_samples, axis=1)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.value[nodes].mean(axis=0)
+
+    def save(self, filename):
+        # Sıkıştırmasız joblib dosyası: diziler dosyada hizalı ham bayt olarak durur, böylece load()
+        # mmap_mode ile açıldığında kopyalanmadan doğrudan dosyadan okunabilir. Dosya tek adımda değiştirilir;
+        # eski dosyayı eşlemiş worker'lar yeni model devreye girene kadar eski kopyayı okumaya devam eder.
+        atomic_dump({
+            "feature": self.feature, "threshold": self.threshold,
+            "left": self.left, "right": self.right, "value": self.value,
+            "roots": self.roots, "max_depth": self.max_depth
+        }, filename)
+
+    @classmethod
+    def load(cls, filename, mmap_mode=None):
+        # mmap_mode="r" → diziler salt okunur bellek eşlemesi (np.memmap) olarak açılır. Aynı dosyayı açan
+        # tüm worker süreçleri işletim sisteminin sayfa önbelleğindeki tek fiziksel kopyayı paylaşır.
+        return cls(**joblib.load(filename, mmap_mode=mmap_mode))
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right, self.value, self.roots))
+
+
+def export_model(model_path="rf_model.pkl", flat_path="rf_model_flat.joblib"):
+    # joblib ile kaydedilmiş ormanı düzleştirip sıkıştırmasız joblib dosyası olarak kaydeder
+    flat = FlatForest.from_sklearn(joblib.load(model_path))
+    flat.save(flat_path)
+    return flat
+
+
+def benchmark(model_path="rf_model.pkl", flat_path="rf_model_flat.joblib", repeats=200):
+    # Rastgele satırlarda sklearn ile birebir aynı sonucu verdiğini doğrular ve gecikmeleri karşılaştırır
+    model = joblib.load(model_path)
+    flat = FlatForest.load(flat_path)
+
+    rng = np.random.default_rng(42)
+    X = rng.uniform(0, 100, size=(1000, model.n_features_in_))
+    X[:, 1] = rng.integers(1996, 1999, size=len(X))        # year
+    if not np.allclose(model.predict(X), flat.predict(X)):
+        raise AssertionError("Düzleştirilmiş orman sklearn ile aynı sonucu vermiyor.")
+    print("Eşlik kontrolü: OK (1000 satır)")
+
+    print(f"Model boyutu: {flat.nbytes / 1e6:.2f} MB, maksimum derinlik: {flat.max_depth}")
+    for batch_size in (1, 8, 64, 1000):
+        batch = X[:batch_size]
+        results = []
+        for predictor in (model.predict, flat.predict):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                predictor(batch)
+            results.append((time.perf_counter() - start) / repeats * 1000)
+        print(f"batch={batch_size:5d}  sklearn: {results[0]:8.3f} ms   flat: {results[1]:8.3f} ms")
+
+
+if __name__ == "__main__":
+    # Kullanım: python -m app.flat_forest export | bench
+    command = sys.argv[1] if len(sys.argv) > 1 else "export"
+    if command == "export":
+        export_model()
+        print("Düzleştirilmiş model rf_model_flat.joblib olarak kaydedildi.")
+    elif command == "bench":
+        benchmark()
+    else:
+        print("Kullanım: python -m app.flat_forest [export|bench]")
@@ -1,25 +1,86 @@
-from fastapi import FastAPI, HTTPException           # FastAPI uygulaması ve hata yönetimi için
+from fastapi import FastAPI, HTTPException, Response # FastAPI uygulaması ve hata yönetimi için
+from contextlib import asynccontextmanager           # Açılış/kapanış kancası (lifespan) için
 from pydantic import BaseModel, Field                # Veri doğrulama ve Swagger açıklamaları için
-import joblib                                        # Eğitimli modeli .pkl dosyasından yüklemek için
 import numpy as np                                   # Sayısal hesaplama işlemleri için
 import pandas as pd                                  # Veri analizi ve veritabanı işlemleri için
-from sqlalchemy import create_engine                 # SQL veritabanı bağlantısı kurmak için
+from fastapi.concurrency import run_in_threadpool    # CPU'ya bağlı model tahminini olay döngüsü dışında çalıştırmak için
 from dotenv import load_dotenv                       # Ortam değişkenlerini .env dosyasından çekmek için
 import os                                            # Ortam değişkenlerini okumak için kullanılır
+from app.product_cache import ProductCache           # Ürün bilgisini süreç içinde önbelleğe almak için
+from app.database import create_async_db_engine, fetch_all  # Asenkron (asyncpg) bağlantı havuzu için
+from app.micro_batch import MicroBatcher             # Eşzamanlı tekil tahminleri tek model.predict çağrısında birleştirmek için
+from app.metrics import instrument, StageTimer       # /metrics uç noktası ve aşama süreleri için
+from app.model_registry import ModelRegistry, install_model_admin, load_forest_model   # Modeli yeniden başlatmadan değiştirmek için
+from app.features import FEATURE_COLUMNS, season_of  # Modelin beklediği kolon sırası ve ay → mevsim tablosu
+from app.queries import PRODUCT_LATEST_ORDER_QUERY   # Parametreli (hazırlanmış) ürün sorgusu
+from app.prediction_cache import PredictionCache, install_prediction_cache_admin   # Tekrarlanan tahminler için
+
+# Kapanışta (ör. SIGTERM) mikro-toplama penceresindeki ve süren toplu tahminler bitirilir; bekleyen istekler yanıtsız kalmaz
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    if batcher is not None:
+        await batcher.close()
 
 # FastAPI uygulaması başlatılır
-app = FastAPI(title="Satış Tahmini API", version="1.0")
+app = FastAPI(title="Satış Tahmini API", version="1.0", lifespan=lifespan)
 
-# Eğitimli model dosyası yüklenir
+# Ortam değişkenleri yüklenir
+load_dotenv()
+
+# Model kaydı: rf_encoders.pkl değişince yeni model arka planda yüklenip ısıtılır ve istekler arasında devreye alınır
+# (MODEL_RELOAD_INTERVAL saniyede bir kontrol, 0 = kapalı; MODEL_HISTORY kadar eski sürüm geri alma için tutulur)
+# Yükleyici app/model_registry.py'deki load_forest_model'dir: MODEL_ENGINE=flat ise düzleştirilmiş NumPy ormanı
+# (rf_model_flat.joblib) bellek eşlemeli açılır, çok worker'lı çalışmada ağaç dizilerinin tek fiziksel kopyası paylaşılır
+registry = ModelRegistry(load_forest_model, "rf_encoders.pkl", n_features=len(FEATURE_COLUMNS),
+                         history_size=int(os.getenv("MODEL_HISTORY", "2")), name="main")
 try:
-    model = joblib.load("rf_model.pkl")
+    registry.load()
 except Exception as e:
     raise RuntimeError("Model yüklenemedi: " + str(e))
+registry.start_watching(float(os.getenv("MODEL_RELOAD_INTERVAL", "30")))
 
-# Ortam değişkenleri yüklenir ve veritabanına bağlantı kurulur
-load_dotenv()
+# Veritabanına asenkron bağlantı havuzu kurulur
+# (havuz boyutu DB_POOL_SIZE / DB_MAX_OVERFLOW ile ayarlanır)
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
+async_engine = create_async_db_engine(DATABASE_URL)
+
+# İstek süreleri, sorgu sayıları ve /metrics uç noktası eklenir
+instrument(app, "main", engines=[async_engine])
+install_model_admin(app, registry)
+
+# Ürün bilgisi önbelleği: boyut ve süre (saniye) ortam değişkenleriyle ayarlanabilir
+product_cache = ProductCache(
+    max_size=int(os.getenv("PRODUCT_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("PRODUCT_CACHE_TTL", "600"))
+)
+
+# İsteğe bağlı mikro-toplama: PREDICT_BATCH_WINDOW_MS > 0 ise aynı pencere içinde gelen istekler
+# (en fazla PREDICT_BATCH_MAX_SIZE satır) tek bir model.predict çağrısında tahmin edilir
+PREDICT_BATCH_WINDOW_MS = float(os.getenv("PREDICT_BATCH_WINDOW_MS", "0"))
+batcher = None
+if PREDICT_BATCH_WINDOW_MS > 0:
+    batcher = MicroBatcher(
+        max_batch_size=int(os.getenv("PREDICT_BATCH_MAX_SIZE", "64")),
+        window_ms=PREDICT_BATCH_WINDOW_MS,
+        name="main"
+    )
+
+# İsteğe bağlı tahmin önbelleği: PREDICTION_CACHE_SIZE > 0 ise (model sürümü, özellik vektörü) → tahmin eşlemesi
+# süreç içinde LRU olarak tutulur (PREDICTION_CACHE_TTL saniye, 0 = süresiz); model değişince kendiliğinden boşalır
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "0"))
+prediction_cache = None
+if PREDICTION_CACHE_SIZE > 0:
+    prediction_cache = PredictionCache(registry, max_size=PREDICTION_CACHE_SIZE,
+                                       ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL", "0")), name="main")
+install_prediction_cache_admin(app, prediction_cache)
+
+# Ürünün adı ve en son siparişinin ülkesi veritabanından çekilir (önbellekte yoksa çağrılır)
+async def load_product_info(product_id):
+    rows = await fetch_all(async_engine, PRODUCT_LATEST_ORDER_QUERY, {"product_id": product_id})
+    if not rows:
+        return None
+    return rows[0]['product_name'], rows[0]['country']
 
 # API'den gelecek veri yapısı tanımlanır
 class PredictionInput(BaseModel):
@@ -30,7 +91,14 @@ class PredictionInput(BaseModel):
 
 # Tahmin yapılacak endpoint
 @app.post("/predict", tags=["Satış Tahmini"])
-def predict(input: PredictionInput):
+async def predict(input: PredictionInput, response: Response):
+    timer = StageTimer("main")   # Aşama süreleri /metrics'te predict_stage_seconds olarak görünür
+
+    # Etkin model sürümü istek başında bir kez alınır; istek boyunca model ve kod tabloları aynı sürümden gelir
+    current = registry.active
+    product_codes = current.artifacts["product_code"]     # ürün adı → kod
+    country_codes = current.artifacts["country_code"]     # ülke → kod
+
     # Tarih formatı kontrol edilir ve datetime formatına dönüştürülür
     try:
         order_date = pd.to_datetime(input.order_date)
@@ -42,45 +110,29 @@ def predict(input: PredictionInput):
     year = order_date.year
     day_of_week = order_date.dayofweek  # Pazartesi = 0, Pazar = 6
 
-    # Mevsim bilgisi ay verisinden hesaplanır, kullanıcıdan gönderilmez
-    def get_season(month):
-        if month in [3, 4, 5]:
-            return 1  # İlkbahar
-        elif month in [6, 7, 8]:
-            return 2  # Yaz
-        elif month in [9, 10, 11]:
-            return 3  # Sonbahar
-        else:
-            return 4  # Kış
-
-    season = get_season(month)
+    # Mevsim bilgisi ay verisinden hesaplanır, kullanıcıdan gönderilmez (eğitimle aynı ay → mevsim tablosu)
+    season = int(season_of(month))
+    timer.mark("parse_date")
 
-    # Ürün adı ve ülke bilgisi veritabanından çekilir, kullanıcı yalnızca product_id gönderir
+    # Ürün adı ve ülke bilgisi önce önbellekten, yoksa veritabanından alınır; kullanıcı yalnızca product_id gönderir
     try:
-        query = f"""
-            SELECT p.product_name, c.country
-            FROM products p
-            JOIN order_details od ON p.product_id = od.product_id
-            JOIN orders o ON od.order_id = o.order_id
-            JOIN customers c ON o.customer_id = c.customer_id
-            WHERE p.product_id = {input.product_id}
-            ORDER BY o.order_date DESC
-            LIMIT 1
-        """
-        result = pd.read_sql(query, engine)
-
-        # Eğer ürün daha önce sipariş edilmemişse hata döndürülür
-        if result.empty:
-            raise HTTPException(status_code=404, detail="Ürün verisi bulunamadı.")
-
-        row = result.iloc[0]
-
-        # Aşağıdaki değişkenler veritabanından gelen değerlere göre otomatik oluşturulur
-        product_code = int(pd.Series(row['product_name']).astype("category").cat.codes[0])  # Ürün adı kategorik koda çevrilir
-        country_code = int(pd.Series(row['country']).astype("category").cat.codes[0])       # Ülke adı kategorik koda çevrilir
+        product_info = await product_cache.get_or_load_async(input.product_id, load_product_info)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Veri çekilirken hata: {str(e)}")
 
+    # Eğer ürün daha önce sipariş edilmemişse hata döndürülür
+    if product_info is None:
+        raise HTTPException(status_code=404, detail="Ürün verisi bulunamadı.")
+
+    product_name, country = product_info
+    timer.mark("product_lookup")
+
+    # Aşağıdaki değişkenler veritabanından gelen değerlere göre otomatik oluşturulur
+    if product_name not in product_codes:
+        raise HTTPException(status_code=400, detail="Ürün eğitim verisinde yok.")
+    product_code = product_codes[product_name]        # Ürün adı, eğitimdeki kategorik koduna çevrilir
+    country_code = country_codes.get(country, -1)     # Ülke adı eğitimdeki koduna çevrilir (eğitimde yoksa -1)
+
     # Ortalama fiyat şimdilik input'tan alınır, ama ileride veritabanından da hesaplanabilir
     avg_price = input.unit_price
 
@@ -98,19 +150,36 @@ def predict(input: PredictionInput):
         input.unit_price,  # Ürünün birim fiyatı (girdi olarak kullanıcıdan gelir)
         avg_price          # Ortalama fiyat (şu an sabit olarak input.unit_price, ileride ürünün genel ortalaması alınabilir)
     ]])
-
-    # Model kullanılarak tahmin yapılır
-    try:
-        prediction = model.predict(features)[0]
-        # Bu çıktı, her örnek için 1 tahmin değeri içerir.
-        # Biz sadece 1 örnek gönderdiğimiz için sonuç: 1 elemanlı array
-        # Bu, dönen array’den ilk ve tek tahmin değerini alır.       
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Tahmin hatası: {str(e)}")
+    timer.mark("features")
+
+    # Aynı model sürümüyle aynı özellik vektörü daha önce tahmin edildiyse sonuç önbellekten gelir
+    cache_key = tuple(features[0].tolist())
+    prediction = prediction_cache.lookup(current.version, cache_key) if prediction_cache is not None else None
+    if prediction is not None:
+        timer.mark("prediction_cache")
+    else:
+        # Model kullanılarak tahmin yapılır
+        try:
+            # model.predict CPU'ya bağlıdır; iş parçacığı havuzunda çalıştırılır ki olay döngüsü diğer istekleri beklemesin
+            # Mikro-toplama açıksa satır, pencere içindeki diğer isteklerle birlikte tek seferde tahmin edilir
+            if batcher is not None:
+                prediction = await batcher.predict(features[0], current.model.predict)
+            else:
+                prediction = (await run_in_threadpool(current.model.predict, features))[0]
+            # Bu çıktı, her örnek için 1 tahmin değeri içerir.
+            # Biz sadece 1 örnek gönderdiğimiz için sonuç: 1 elemanlı array
+            # Bu, dönen array’den ilk ve tek tahmin değerini alır.       
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Tahmin hatası: {str(e)}")
+        timer.mark("predict")
+        if prediction_cache is not None:
+            prediction_cache.store(current.version, cache_key, prediction)
 
     # Tahmin ve özet bilgiler API yanıtı olarak döndürülür
+    response.headers["X-Model-Version"] = current.version
     return {
         "tahmin_edilen_satis_tutari": round(float(prediction), 2),
+        "model_version": current.version,
         "girdi_ozeti": {
             "product_id": input.product_id,
             "unit_price": input.unit_price,
@@ -121,3 +190,18 @@ def predict(input: PredictionInput):
             "product_code": product_code    # Veritabanından geldi
         }
     }
+
+# Önbellek istatistikleri (isabet/ıska sayıları, doluluk)
+@app.get("/admin/cache", tags=["Yönetim"])
+async def cache_stats():
+    return product_cache.stats()
+
+# Önbellek elle temizlenir (örneğin model yeniden eğitildikten veya ürün verisi değiştikten sonra)
+@app.post("/admin/cache/clear", tags=["Yönetim"])
+async def cache_clear():
+    return {"temizlenen_kayit": product_cache.clear()}
+
+# Mikro-toplama istatistikleri (kapalıysa boş döner)
+@app.get("/admin/batching", tags=["Yönetim"])
+async def batching_stats():
+    return batcher.stats() if batcher is not None else {"enabled": False}
@@ -0,0 +1,185 @@
+from contextlib import asynccontextmanager      # Açılış/kapanış kancası (lifespan) için
+from datetime import datetime                   # Tarih ayrıştırma (pandas yerine standart kütüphane)
+import asyncio
+import os
+import asyncpg                                  # SQLAlchemy katmanı olmadan doğrudan PostgreSQL sürücüsü
+import numpy as np
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from dotenv import load_dotenv
+from app.product_cache import ProductCache
+from app.metrics import instrument, StageTimer, DB_QUERIES
+from app.model_registry import ModelRegistry, install_model_admin, load_forest_model
+from app.queries import PRODUCT_LATEST_ORDER_QUERY
+
+
+# app/main.py'deki /predict'in hızlı açılan servis sürümü (aynı istek ve yanıt biçimi):
+#   - pandas, SQLAlchemy ve sklearn içe aktarılmaz: tarih standart kütüphaneyle ayrıştırılır, ürün sorgusu
+#     asyncpg havuzuyla doğrudan çalışır, model her zaman düzleştirilmiş NumPy ormanıdır (rf_model_flat.joblib)
+#   - Modül içe aktarılırken hiçbir dosya yüklenmez; model açılış kancasında arka planda yüklenir.
+#     Bu sürede süreç bağlantı kabul eder, /ready ve /predict 503 (Retry-After) döner
+#
+# Çalıştırma: uvicorn app.main_lean:app --host 0.0.0.0 --port 8000
+# Açılış karşılaştırması: python -m app.benchmark --cold-start
+
+load_dotenv()
+
+# randomforest_sales.py'deki FEATURE_COLUMNS ile aynı sıra (features.py pandas içe aktardığı için burada tekrar edilir):
+# month, year, day_of_week, season, country_code, product_code, quantity, unit_price, avg_price
+N_FEATURES = 9
+
+# Ay → mevsim (1 = İlkbahar, 2 = Yaz, 3 = Sonbahar, 4 = Kış; 0. eleman kullanılmaz).
+# features.SEASON_BY_MONTH'un kopyasıdır (aynı sebeple); tablo değişirse ikisi birlikte değiştirilmeli
+SEASON_BY_MONTH = (0, 4, 4, 1, 1, 1, 2, 2, 2, 3, 3, 3, 4)
+
+# asyncpg numaralı parametre ($1) bekler; sorgu metni main.py ile ortaktır
+PRODUCT_QUERY = PRODUCT_LATEST_ORDER_QUERY.replace(":product_id", "$1")
+
+
+def load_model():
+    return load_forest_model("flat")
+
+
+def asyncpg_dsn(database_url):
+    # SQLAlchemy sürücü önekini (postgresql+psycopg2://, postgresql+asyncpg://) asyncpg'nin anladığı biçime çevirir
+    url = os.getenv("ASYNC_DATABASE_URL") or database_url
+    scheme, rest = url.split("://", 1)
+    return scheme.split("+")[0] + "://" + rest
+
+
+registry = ModelRegistry(load_model, "rf_encoders.pkl", n_features=N_FEATURES,
+                         history_size=int(os.getenv("MODEL_HISTORY", "2")), name="main_lean")
+pool = None
+model_error = None      # Açılıştaki yükleme hatası (/ready'de gösterilir)
+
+
+async def load_in_background():
+    global model_error
+    try:
+        await run_in_threadpool(registry.load)
+        registry.start_watching(float(os.getenv("MODEL_RELOAD_INTERVAL", "30")))
+        model_error = None
+    except Exception as e:
+        model_error = str(e)
+        print("Model yüklenemedi:", e)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Havuz boş açılır (min_size=0): veritabanına ilk istekte bağlanılır, açılışı bekletmez
+    global pool
+    pool = await asyncpg.create_pool(
+        asyncpg_dsn(os.getenv("DATABASE_URL")),
+        min_size=0,
+        max_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+    )
+    loading = asyncio.create_task(load_in_background())
+    yield
+    registry.stop()
+    loading.cancel()
+    await pool.close()
+
+
+app = FastAPI(title="Satış Tahmini API (hızlı açılış)", version="1.0", lifespan=lifespan)
+instrument(app, "main_lean")
+install_model_admin(app, registry)
+
+product_cache = ProductCache(
+    max_size=int(os.getenv("PRODUCT_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("PRODUCT_CACHE_TTL", "600"))
+)
+
+
+def not_ready_response():
+    return JSONResponse(status_code=503, headers={"Retry-After": "1"},
+                        content={"ready": False, "error": model_error})
+
+
+# Canlılık: süreç ayakta mı (model beklenmez)
+@app.get("/health", tags=["Yönetim"])
+async def health():
+    return {"status": "ok"}
+
+
+# Hazırlık: model yüklendi mi (yük dengeleyici / Kubernetes readinessProbe bu uç noktayı kullanır)
+@app.get("/ready", tags=["Yönetim"])
+async def ready():
+    current = registry.active
+    if current is None:
+        return not_ready_response()
+    return {"ready": True, "model_version": current.version}
+
+
+async def load_product_info(product_id):
+    async with pool.acquire() as conn:
+        DB_QUERIES.inc(app="main_lean")
+        row = await conn.fetchrow(PRODUCT_QUERY, product_id)
+    if row is None:
+        return None
+    return row['product_name'], row['country']
+
+
+class PredictionInput(BaseModel):
+    product_id: int = Field(..., description="Tahmin yapılacak ürünün ID'si. Veritabanındaki product_id ile eşleşmelidir.")
+    unit_price: float = Field(..., description="Ürünün satış birim fiyatı. Tahmin girişinde kullanılır.")
+    quantity: int = Field(..., description="Sipariş edilen ürün miktarı.")
+    order_date: str = Field(..., description="Sipariş tarihi. Format: YYYY-MM-DD (örnek: 2024-12-31)")
+
+
+@app.post("/predict", tags=["Satış Tahmini"])
+async def predict(input: PredictionInput, response: Response):
+    timer = StageTimer("main_lean")
+    current = registry.active
+    if current is None:
+        return not_ready_response()
+    product_codes = current.artifacts["product_code"]
+    country_codes = current.artifacts["country_code"]
+
+    try:
+        order_date = datetime.fromisoformat(input.order_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Tarih formatı hatalı. YYYY-MM-DD kullanın.")
+    season = SEASON_BY_MONTH[order_date.month]
+    timer.mark("parse_date")
+
+    try:
+        product_info = await product_cache.get_or_load_async(input.product_id, load_product_info)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Veri çekilirken hata: {str(e)}")
+    if product_info is None:
+        raise HTTPException(status_code=404, detail="Ürün verisi bulunamadı.")
+    product_name, country = product_info
+    timer.mark("product_lookup")
+
+    if product_name not in product_codes:
+        raise HTTPException(status_code=400, detail="Ürün eğitim verisinde yok.")
+    product_code = product_codes[product_name]
+    country_code = country_codes.get(country, -1)
+
+    features = np.array([[order_date.month, order_date.year, order_date.weekday(), season, country_code,
+                          product_code, input.quantity, input.unit_price, input.unit_price]])
+    timer.mark("features")
+
+    try:
+        prediction = (await run_in_threadpool(current.model.predict, features))[0]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Tahmin hatası: {str(e)}")
+    timer.mark("predict")
+
+    response.headers["X-Model-Version"] = current.version
+    return {
+        "tahmin_edilen_satis_tutari": round(float(prediction), 2),
+        "model_version": current.version,
+        "girdi_ozeti": {
+            "product_id": input.product_id,
+            "unit_price": input.unit_price,
+            "quantity": input.quantity,
+            "order_date": input.order_date,
+            "season": season,
+            "country_code": country_code,
+            "product_code": product_code
+        }
+    }
@@ -1,26 +1,63 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List                          # Burada değişiklik var: artık API giriş tipi liste olacak
-import joblib
 import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
+import asyncio
+import json
 import os
+from app.database import create_async_db_engine, fetch_all
+from app.features import date_features, parse_dates, FEATURE_COLUMNS
+from app.model_registry import ModelRegistry, install_model_admin, load_forest_model
+from app.bulk_io import media_format, read_table, write_table, ndjson_lines, FORMAT_MEDIA_TYPES
+from app.metrics import instrument, StageTimer, BATCH_SIZE
+from app.queries import PRODUCTS_LATEST_ORDER_QUERY
+from app.admission import install_admission_control
 
 # FastAPI uygulaması başlatılır
 app = FastAPI(title="Toplu Satış Tahmini API", version="1.0")
 
-# Eğitimli model yüklenir
+# Ortam değişkenleri yüklenir
+load_dotenv()
+
+# Model kaydı: yeniden eğitilen model arka planda yüklenip istekler arasında devreye alınır (bkz. app/main.py).
+# Model app/main.py ile aynı yükleyiciyle açılır (MODEL_ENGINE=flat → worker'lar arasında paylaşılan mmap)
+registry = ModelRegistry(load_forest_model, "rf_encoders.pkl", n_features=len(FEATURE_COLUMNS),
+                         history_size=int(os.getenv("MODEL_HISTORY", "2")), name="main_many_sales")
 try:
-    model = joblib.load("rf_model.pkl")
+    registry.load()
 except Exception as e:
     raise RuntimeError("Model yüklenemedi: " + str(e))
+registry.start_watching(float(os.getenv("MODEL_RELOAD_INTERVAL", "30")))
 
-# Ortam değişkenleri yüklenir ve veritabanı bağlantısı kurulur
-load_dotenv()
+# Asenkron veritabanı bağlantı havuzu kurulur
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
+async_engine = create_async_db_engine(DATABASE_URL)
+
+# İstek süreleri, sorgu sayıları ve /metrics uç noktası eklenir
+instrument(app, "main_many_sales", engines=[async_engine])
+install_model_admin(app, registry)
+
+# Aşırı yükte geri basınç: küçük ve büyük toplu istekler ayrı eşzamanlılık sınırı ve sınırlı kuyrukla kabul edilir,
+# kuyruk dolunca 429 / kuyrukta zaman aşımında 503 (Retry-After) döner (ayarlar için app/admission.py)
+install_admission_control(app, "main_many_sales", paths=["/predict/batch", "/predict/batch/columnar"])
+
+# İstek başına en fazla satır (aşılırsa 413) ve tahmin/yanıtın tek seferde işlenen parça büyüklüğü.
+# Parçalar arasında olay döngüsü serbest kalır; büyük bir batch diğer istekleri baştan sona bekletmez.
+BATCH_MAX_ROWS = int(os.getenv("PREDICT_BATCH_MAX_ROWS", "100000"))
+BATCH_CHUNK_ROWS = int(os.getenv("PREDICT_BATCH_CHUNK_ROWS", "5000"))
+
+def check_batch_size(n_rows):
+    if n_rows > BATCH_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Bir istekte en fazla {BATCH_MAX_ROWS} satır gönderilebilir.")
+
+async def predict_chunked(model, feature_matrix):
+    # Model parça parça (BATCH_CHUNK_ROWS satır) iş parçacığı havuzunda çağrılır (boş girişte bir kez, eskisi gibi)
+    return np.concatenate([await run_in_threadpool(model.predict, feature_matrix[start:start + BATCH_CHUNK_ROWS])
+                           for start in range(0, max(len(feature_matrix), 1), BATCH_CHUNK_ROWS)])
 
 # Girdi yapısı tanımlanır
 class PredictionInput(BaseModel):
@@ -29,105 +66,200 @@ class PredictionInput(BaseModel):
     quantity: int = Field(..., description="Sipariş edilen miktar")
     order_date: str = Field(..., description="Sipariş tarihi (YYYY-MM-DD formatında)")
 
+# DEĞİŞEN YER: Ürün adı ve ülke bilgisi her satır için ayrı ayrı değil, tek bir sorguyla çekilir.
+# Batch içindeki farklı product_id'ler toplanır ve her ürünün en son siparişi DISTINCT ON ile bulunur.
+# Böylece veritabanına gidiş sayısı satır sayısından bağımsız olur (1 sorgu).
+async def lookup_products(current, product_ids):
+    try:
+        lookup = await fetch_all(async_engine, PRODUCTS_LATEST_ORDER_QUERY, {"product_ids": product_ids})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Veri çekilirken hata: {str(e)}")
+
+    # product_id → (product_code, country_code) eşlemesi bellekte tutulur
+    product_codes = current.artifacts["product_code"]
+    country_codes = current.artifacts["country_code"]
+    product_info = {}
+    for row in lookup:
+        # Ürün adı ve ülke bilgisi eğitimde kaydedilen kod tablolarından kategorik sayıya çevrilir
+        if row['product_name'] not in product_codes:
+            raise HTTPException(status_code=400, detail=f"Ürün eğitim verisinde yok: {row['product_id']}")
+        product_code = product_codes[row['product_name']]
+        country_code = country_codes.get(row['country'], -1)
+        product_info[int(row['product_id'])] = (product_code, country_code)
+    return product_info
+
+# Sipariş tarihleri topluca çözülür (ISO 8601 hızlı yol, diğer biçimler ve karışık saat dilimleri için tek tek;
+# bkz. app.features.parse_dates). Çözülemeyen ilk tarih 400 ile bildirilir
+def parse_order_dates(order_date_col):
+    order_dates = parse_dates(order_date_col)
+    invalid = order_dates.isna().to_numpy()
+    if invalid.any():
+        raise HTTPException(status_code=400, detail=f"Tarih formatı hatalı: {order_date_col.iloc[int(invalid.argmax())]}")
+    return date_features(order_dates)      # month, year, day_of_week, season
+
+# Ürün bilgisi toplu sorgudan gelen eşlemeden dizi indeksiyle alınır (veritabanına tekrar gidilmez)
+def encode_products(product_info, product_ids, product_id_col):
+    known_ids = np.array(product_ids, dtype=np.int64)
+    found_by_id = np.array([pid in product_info for pid in product_ids], dtype=bool)
+    codes_by_id = np.array([product_info.get(pid, (-1, -1)) for pid in product_ids], dtype=np.int32).reshape(-1, 2)
+    position = np.searchsorted(known_ids, product_id_col)
+    found = found_by_id[position]
+    if not found.all():
+        raise HTTPException(status_code=404, detail=f"Ürün verisi bulunamadı: {int(product_id_col[found.argmin()])}")
+    return codes_by_id[position, 0], codes_by_id[position, 1]     # product_code, country_code
+
+# Modelin beklediği sıraya göre (app.features.FEATURE_COLUMNS) özellik matrisi hazırlanır
+def build_feature_matrix(dates, country_code_col, product_code_col, quantity_col, unit_price_col):
+    # Ortalama fiyat input'tan alınır (istersen burada farklı stratejiler kullanabilirsin)
+    avg_price_col = unit_price_col
+    return np.column_stack([
+        dates["month"],
+        dates["year"],
+        dates["day_of_week"],
+        dates["season"],
+        country_code_col,
+        product_code_col,
+        quantity_col,
+        unit_price_col,
+        avg_price_col
+    ])
+
 # Tahmin endpoint'i tanımlanır
 # DEĞİŞEN YER: Artık tek bir input değil, bir liste alıyoruz → bu sayede çoklu tahmin yapılabiliyor
 @app.post("/predict/batch", tags=["Toplu Tahmin"])
-def predict_batch(inputs: List[PredictionInput]):
-    feature_list = []   # Her siparişe ait model girdileri burada toplanacak
-    results = []        # Her tahmine ait açıklayıcı veriler burada saklanacak
-
-    # Tüm giriş verileri üzerinde döngü kurulur
-    for input in inputs:
-        # Sipariş tarihi string formatından datetime nesnesine çevrilir
-        try:
-            order_date = pd.to_datetime(input.order_date)
-        except Exception:
-            raise HTTPException(status_code=400, detail=f"Tarih formatı hatalı: {input.order_date}")
-
-        # Tarihten yıl, ay ve haftanın günü bilgileri çıkarılır (otomatik)
-        month = order_date.month
-        year = order_date.year
-        day_of_week = order_date.dayofweek
-
-        # Mevsim bilgisi ay üzerinden belirlenir
-        def get_season(month):
-            if month in [3, 4, 5]:
-                return 1  # İlkbahar
-            elif month in [6, 7, 8]:
-                return 2  # Yaz
-            elif month in [9, 10, 11]:
-                return 3  # Sonbahar
-            else:
-                return 4  # Kış
-
-        season = get_season(month)
-
-        # Ürünün adı ve ülke bilgisi veritabanından çekilir
-        try:
-            query = f"""
-                SELECT p.product_name, c.country
-                FROM products p
-                JOIN order_details od ON p.product_id = od.product_id
-                JOIN orders o ON od.order_id = o.order_id
-                JOIN customers c ON o.customer_id = c.customer_id
-                WHERE p.product_id = {input.product_id}
-                ORDER BY o.order_date DESC
-                LIMIT 1
-            """
-            result = pd.read_sql(query, engine)
-
-            if result.empty:
-                raise HTTPException(status_code=404, detail=f"Ürün verisi bulunamadı: {input.product_id}")
-
-            row = result.iloc[0]
-            # Ürün adı ve ülke bilgisi kategorik sayıya çevrilir
-            product_code = int(pd.Series(row['product_name']).astype("category").cat.codes[0])
-            country_code = int(pd.Series(row['country']).astype("category").cat.codes[0])
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Veri çekilirken hata: {str(e)}")
-
-        # Ortalama fiyat input'tan alınır (istersen burada farklı stratejiler kullanabilirsin)
-        avg_price = input.unit_price
-
-        # Modelin beklediği sıraya göre özellik vektörü hazırlanır
-        feature_vector = [
-            month,
-            year,
-            day_of_week,
-            season,
-            country_code,
-            product_code,
-            input.quantity,
-            input.unit_price,
-            avg_price
-        ]
-
-        feature_list.append(feature_vector)  # Bu tahmin için satır eklendi
-
-        # Girdiye dair açıklayıcı bilgiler sonuca eklenmek üzere kaydedilir
-        results.append({
-            "product_id": input.product_id,
-            "unit_price": input.unit_price,
-            "quantity": input.quantity,
-            "order_date": input.order_date,
-            "season": season,
-            "country_code": country_code,
-            "product_code": product_code
-        })
+async def predict_batch(inputs: List[PredictionInput]):
+    timer = StageTimer("main_many_sales")
+    check_batch_size(len(inputs))
+    BATCH_SIZE.observe(len(inputs), app="main_many_sales")
+
+    # Etkin model sürümü istek başında bir kez alınır (tüm batch aynı model ve kod tablolarıyla tahmin edilir)
+    current = registry.active
+
+    product_ids = sorted({input.product_id for input in inputs})
+    product_info = await lookup_products(current, product_ids)
+    timer.mark("product_lookup")
+
+    # DEĞİŞEN YER: Girdiler satır satır işlenmek yerine kolonlara ayrılır; tarih, mevsim ve ürün kodları
+    # tüm batch için tek seferde (vektörel) hesaplanır
+    product_id_col = np.array([input.product_id for input in inputs], dtype=np.int64)
+    quantity_col = np.array([input.quantity for input in inputs], dtype=np.float64)
+    unit_price_col = np.array([input.unit_price for input in inputs], dtype=np.float64)
+    dates = parse_order_dates(pd.Series([input.order_date for input in inputs]))
+    timer.mark("parse_input")
+
+    product_code_col, country_code_col = encode_products(product_info, product_ids, product_id_col)
+    feature_matrix = build_feature_matrix(dates, country_code_col, product_code_col, quantity_col, unit_price_col)
+
+    timer.mark("features")
 
     # DEĞİŞEN YER: Artık model.predict() çoklu veriyle çağrılır → tek tek değil topluca tahmin yapılır
     try:
-        features = np.array(feature_list)
-        predictions = model.predict(features)
+        # Toplu tahmin CPU'ya bağlıdır; olay döngüsünü bloklamaması için iş parçacığı havuzunda (parça parça) çalıştırılır
+        predictions = await predict_chunked(current.model, feature_matrix)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Tahmin hatası: {str(e)}")
+    timer.mark("predict")
 
-    # Tüm tahmin sonuçları birleştirilerek kullanıcıya anlamlı şekilde döndürülür
+    # Tüm tahmin sonuçları girdiye dair açıklayıcı bilgilerle birleştirilerek kullanıcıya anlamlı şekilde döndürülür.
+    # Yanıt parça parça kurulur; her parçadan sonra olay döngüsü diğer isteklere döner
+    seasons, country_codes, product_codes = dates["season"].tolist(), country_code_col.tolist(), product_code_col.tolist()
     output = []
-    for i, prediction in enumerate(predictions):
-        output.append({
-            "tahmin_edilen_satis_tutari": round(float(prediction), 2),
-            "girdi_ozeti": results[i]
-        })
+    for start in range(0, len(inputs), BATCH_CHUNK_ROWS):
+        for i in range(start, min(start + BATCH_CHUNK_ROWS, len(inputs))):
+            input = inputs[i]
+            output.append({
+                "tahmin_edilen_satis_tutari": round(float(predictions[i]), 2),
+                "girdi_ozeti": {
+                    "product_id": input.product_id,
+                    "unit_price": input.unit_price,
+                    "quantity": input.quantity,
+                    "order_date": input.order_date,
+                    "season": seasons[i],
+                    "country_code": country_codes[i],
+                    "product_code": product_codes[i]
+                }
+            })
+        await asyncio.sleep(0)
+
+    # JSON'a çevirme FastAPI'nin (olay döngüsünde çalışan ve büyük listelerde yavaş olan) jsonable_encoder'ı yerine
+    # iş parçacığında json.dumps ile yapılır; çıktı JSONResponse ile aynı ayarlarla üretilir
+    body = await run_in_threadpool(json.dumps, output, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    timer.mark("serialize")
+
+    # Yanıt bir liste olduğu için kullanılan model sürümü başlıkta bildirilir
+    return Response(body, media_type="application/json", headers={"X-Model-Version": current.version})
+
+# NDJSON akışında tek seferde tahmin edilip gönderilen satır sayısı
+STREAM_CHUNK_ROWS = int(os.getenv("PREDICT_STREAM_CHUNK_ROWS", "10000"))
+
+# Sonuçlar parça parça tahmin edilip gönderilir: ilk satırlar tüm batch bitmeden istemciye ulaşır,
+# yanıt tarafında bellekte aynı anda en fazla bir parçanın çıktısı tutulur
+async def stream_predictions(model, feature_matrix, summary):
+    for start in range(0, len(summary), STREAM_CHUNK_ROWS):
+        end = start + STREAM_CHUNK_ROWS
+        chunk = summary.iloc[start:end].copy()
+        chunk["tahmin_edilen_satis_tutari"] = (await run_in_threadpool(model.predict, feature_matrix[start:end])).round(2)
+        yield ndjson_lines(chunk)
+
+# Kolon tabanlı toplu tahmin: gövde Arrow IPC akışı, Parquet, CSV ya da NDJSON olabilir (Content-Type ile belirtilir).
+# Satırlar Pydantic nesnelerine çevrilmeden doğrudan NumPy kolonlarına okunur. Yanıt biçimi Accept başlığıyla seçilir
+# (yoksa girdiyle aynı biçim); application/x-ndjson istenirse sonuçlar parça parça akış olarak döner.
+@app.post("/predict/batch/columnar", tags=["Toplu Tahmin"], openapi_extra={
+    "requestBody": {"required": True, "content": {media_type: {"schema": {"type": "string", "format": "binary"}}
+                                                  for media_type in FORMAT_MEDIA_TYPES.values()}}
+})
+async def predict_batch_columnar(request: Request):
+    timer = StageTimer("main_many_sales")
+    input_format = media_format(request.headers.get("content-type"))
+    if input_format is None:
+        raise HTTPException(status_code=415, detail=f"Desteklenen içerik türleri: {', '.join(FORMAT_MEDIA_TYPES.values())}")
+    output_format = media_format(request.headers.get("accept")) or input_format
+
+    try:
+        df = await run_in_threadpool(read_table, await request.body(), input_format)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Gövde okunamadı: {str(e)}")
+    check_batch_size(len(df))
+    BATCH_SIZE.observe(len(df), app="main_many_sales")
+
+    current = registry.active
+    product_id_col = df["product_id"].to_numpy(dtype=np.int64)
+    product_ids = np.unique(product_id_col).tolist()
+    product_info = await lookup_products(current, product_ids)
+    timer.mark("product_lookup")
+
+    quantity_col = df["quantity"].to_numpy(dtype=np.float64)
+    unit_price_col = df["unit_price"].to_numpy(dtype=np.float64)
+    dates = parse_order_dates(df["order_date"])
+    timer.mark("parse_input")
+
+    product_code_col, country_code_col = encode_products(product_info, product_ids, product_id_col)
+    feature_matrix = build_feature_matrix(dates, country_code_col, product_code_col, quantity_col, unit_price_col)
+
+    # JSON yanıtındaki girdi_ozeti alanlarının düz kolon karşılıkları
+    summary = pd.DataFrame({
+        "product_id": product_id_col,
+        "unit_price": unit_price_col,
+        "quantity": df["quantity"].to_numpy(),
+        "order_date": df["order_date"].to_numpy(),
+        "season": dates["season"],
+        "country_code": country_code_col,
+        "product_code": product_code_col
+    })
+    timer.mark("features")
+
+    headers = {"X-Model-Version": current.version}
+    if output_format == "ndjson":
+        return StreamingResponse(stream_predictions(current.model, feature_matrix, summary),
+                                 media_type=FORMAT_MEDIA_TYPES["ndjson"], headers=headers)
+
+    try:
+        predictions = await predict_chunked(current.model, feature_matrix)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Tahmin hatası: {str(e)}")
+    summary["tahmin_edilen_satis_tutari"] = predictions.round(2)
+    timer.mark("predict")
 
-    return output
+    body = await run_in_threadpool(write_table, summary, output_format)
+    timer.mark("serialize")
+    return Response(body, media_type=FORMAT_MEDIA_TYPES[output_format], headers=headers)
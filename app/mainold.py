@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
 import joblib
 import numpy as np
@@ -6,20 +6,65 @@ import pandas as pd
 from sqlalchemy import create_engine
 from dotenv import load_dotenv
 import os
+from fastapi.concurrency import run_in_threadpool
+from app.product_cache import ProductCache
+from app.feature_store import MonthlySalesStore
+from app.database import create_async_db_engine, fetch_all
+from app.metrics import instrument, StageTimer
+from app.model_registry import ModelRegistry, install_model_admin
+from app.queries import PRODUCT_NAME_QUERY
+from app.prediction_cache import PredictionCache, install_prediction_cache_admin
 
 app = FastAPI(title="Satış Tahmini API", version="2.0")
 
+load_dotenv()
+
 # Model ve veri yükleme
+# train_model.py önce product_code_map.pkl'yi, en son sales_model.pkl'yi yazar; sales_model.pkl değişince
+# yeni sürüm arka planda yüklenip istekler arasında devreye alınır (MODEL_RELOAD_INTERVAL, MODEL_HISTORY)
+def load_model():
+    return joblib.load("sales_model.pkl"), {"product_code_map": joblib.load("product_code_map.pkl")}
+
+registry = ModelRegistry(load_model, "sales_model.pkl", n_features=6,
+                         history_size=int(os.getenv("MODEL_HISTORY", "2")), name="mainold")
 try:
-    model = joblib.load("sales_model.pkl")
-    product_code_map = joblib.load("product_code_map.pkl")
+    registry.load()
 except Exception as e:
     raise RuntimeError("Model veya eşleme dosyası yüklenemedi: " + str(e))
-
-load_dotenv()
+registry.start_watching(float(os.getenv("MODEL_RELOAD_INTERVAL", "30")))
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL)               # Özellik deposunun arka plan yenilemesi için (senkron)
+async_engine = create_async_db_engine(DATABASE_URL)  # İstek yolundaki sorgular için (asyncpg havuzu)
+
+instrument(app, "mainold", engines=[engine, async_engine])
+install_model_admin(app, registry)
+
+# Ürün adı önbelleği (PRODUCT_CACHE_SIZE / PRODUCT_CACHE_TTL ile ayarlanır)
+product_cache = ProductCache(
+    max_size=int(os.getenv("PRODUCT_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("PRODUCT_CACHE_TTL", "600"))
+)
+
+# Tahmin önbelleği (PREDICTION_CACHE_SIZE > 0 ise açık): anahtar model sürümü + özellik vektörüdür;
+# gecikme özellikleri depo yenilenince değiştiğinden eski kayıtlar kendiliğinden kullanılmaz olur
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "0"))
+prediction_cache = None
+if PREDICTION_CACHE_SIZE > 0:
+    prediction_cache = PredictionCache(registry, max_size=PREDICTION_CACHE_SIZE,
+                                       ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL", "0")), name="mainold")
+install_prediction_cache_admin(app, prediction_cache)
+
+# Aylık ürün satış deposu: açılışta bir kez kurulur, FEATURE_STORE_REFRESH saniyede bir artımlı yenilenir
+feature_store = MonthlySalesStore(engine)
+feature_store.build()
+feature_store.start_auto_refresh(float(os.getenv("FEATURE_STORE_REFRESH", "300")))
+
+async def load_product_name(product_id):
+    rows = await fetch_all(async_engine, PRODUCT_NAME_QUERY, {"product_id": product_id})
+    if not rows:
+        return None
+    return rows[0]['product_name']
 
 class PredictionInput(BaseModel):
     product_id: int
@@ -27,73 +72,55 @@ class PredictionInput(BaseModel):
     order_date: str  # YYYY-MM-DD
 
 @app.post("/predict", tags=["Tahmin"])
-def predict(input: PredictionInput):
+async def predict(input: PredictionInput, response: Response):
+    timer = StageTimer("mainold")
+    current = registry.active                       # İstek boyunca aynı model sürümü kullanılır
+    product_code_map = current.artifacts["product_code_map"]
     try:
         order_date = pd.to_datetime(input.order_date)
     except Exception:
         raise HTTPException(status_code=400, detail="Geçersiz tarih formatı. YYYY-MM-DD kullanın.")
 
-    prev_month = (order_date - pd.DateOffset(months=1)).strftime('%Y-%m')
     order_month_num = int(order_date.strftime('%Y%m'))
     month_only = order_date.month
+    timer.mark("parse_date")
 
     # Ürün adı bul
     try:
-        product_query = f"SELECT product_name FROM products WHERE product_id = {input.product_id}"
-        product_result = pd.read_sql(product_query, engine)
-        if product_result.empty:
-            raise HTTPException(status_code=404, detail="Ürün bulunamadı.")
-        product_name = product_result['product_name'].iloc[0]
-        if product_name not in product_code_map:
-            raise HTTPException(status_code=400, detail="Ürün eğitim verisinde yok.")
-        product_code = product_code_map[product_name]
+        product_name = await product_cache.get_or_load_async(input.product_id, load_product_name)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ürün kodu belirlenirken hata: {str(e)}")
+    if product_name is None:
+        raise HTTPException(status_code=404, detail="Ürün bulunamadı.")
+    if product_name not in product_code_map:
+        raise HTTPException(status_code=400, detail="Ürün eğitim verisinde yok.")
+    product_code = product_code_map[product_name]
+    timer.mark("product_lookup")
 
-    # Önceki ay satış
-    try:
-        prev_q = f"""
-            SELECT SUM(od.quantity) AS prev_month_sales
-            FROM order_details od
-            JOIN orders o ON od.order_id = o.order_id
-            WHERE od.product_id = {input.product_id}
-            AND TO_CHAR(o.order_date, 'YYYY-MM') = '{prev_month}'
-        """
-        prev_df = pd.read_sql(prev_q, engine)
-        if prev_df.empty or prev_df['prev_month_sales'].isnull().all():
-            prev_month_sales = 0
-        else:
-            prev_month_sales = prev_df['prev_month_sales'].fillna(0).iloc[0]
-    except:
-        prev_month_sales = 0
-
-    # Rolling 3 aylık ortalama
-    try:
-        roll_q = f"""
-            SELECT TO_CHAR(o.order_date, 'YYYY-MM') AS order_month, SUM(od.quantity) AS quantity
-            FROM order_details od
-            JOIN orders o ON od.order_id = o.order_id
-            WHERE od.product_id = {input.product_id}
-            AND o.order_date < '{order_date.strftime('%Y-%m-%d')}'
-            GROUP BY order_month
-            ORDER BY order_month DESC
-            LIMIT 3
-        """
-        roll_df = pd.read_sql(roll_q, engine)
-        sales_rolling_3 = roll_df['quantity'].mean() if not roll_df.empty else 0
-    except:
-        sales_rolling_3 = 0
+    # Önceki ay satışı ve 3 aylık ortalama, bellekteki aylık satış deposundan okunur (eğitimle aynı tanım)
+    prev_month_sales, sales_rolling_3 = feature_store.lag_features(input.product_id, order_date.year, order_date.month)
+    timer.mark("lag_features")
 
     # Özellik vektörü
-    try:
-        data = np.array([[order_month_num, product_code, input.unit_price,
-                          month_only, prev_month_sales, sales_rolling_3]])
-        prediction = model.predict(data)[0]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Tahmin hatası: {str(e)}")
+    cache_key = (order_month_num, int(product_code), input.unit_price, month_only, prev_month_sales, sales_rolling_3)
+    prediction = prediction_cache.lookup(current.version, cache_key) if prediction_cache is not None else None
+    if prediction is not None:
+        timer.mark("prediction_cache")
+    else:
+        try:
+            data = np.array([[order_month_num, product_code, input.unit_price,
+                              month_only, prev_month_sales, sales_rolling_3]])
+            prediction = (await run_in_threadpool(current.model.predict, data))[0]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Tahmin hatası: {str(e)}")
+        timer.mark("predict")
+        if prediction_cache is not None:
+            prediction_cache.store(current.version, cache_key, prediction)
 
+    response.headers["X-Model-Version"] = current.version
     return {
         "tahmin_edilen_satis_miktari": round(prediction, 2),
+        "model_version": current.version,
         "kullanilan_veri": {
             "order_month_num": order_month_num,
             "product_code": int(product_code),
@@ -103,3 +130,20 @@ def predict(input: PredictionInput):
             "sales_rolling_3": round(sales_rolling_3, 2)
         }
     }
+
+@app.get("/admin/cache", tags=["Yönetim"])
+async def cache_stats():
+    return product_cache.stats()
+
+@app.post("/admin/cache/clear", tags=["Yönetim"])
+async def cache_clear():
+    return {"temizlenen_kayit": product_cache.clear()}
+
+@app.get("/admin/feature-store", tags=["Yönetim"])
+async def feature_store_stats():
+    return feature_store.stats()
+
+@app.post("/admin/feature-store/refresh", tags=["Yönetim"])
+async def feature_store_refresh():
+    await run_in_threadpool(feature_store.refresh)
+    return feature_store.stats()
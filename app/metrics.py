@@ -0,0 +1,161 @@
+import threading
+import time
+from contextlib import contextmanager
+from fastapi.responses import PlainTextResponse
+from app.profiler import install_profiler
+
+
+# Prometheus metin formatında (/metrics) okunabilen, bağımlılıksız küçük bir metrik kütüphanesi.
+# Sayaçlar ve histogramlar etiket (label) değerlerine göre ayrı seriler tutar; tüm metrikler
+# REGISTRY'ye kaydolur ve instrument() ile her FastAPI uygulamasına /metrics uç noktası eklenir.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "".join(metric.render() for metric in self.metrics)
+
+
+REGISTRY = Registry()
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}           # etiketler → [kova sayıları..., toplam, adet]
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        # with HISTOGRAM.time(app=..., stage=...): bloğun süresini saniye olarak kaydeder
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+# Uygulamaların ortak metrikleri
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP isteklerinin toplam süresi",
+                            ("app", "path", "status"))
+STAGE_SECONDS = Histogram("predict_stage_seconds", "Tahmin isteğindeki aşamaların süresi",
+                          ("app", "stage"))
+DB_QUERIES = Counter("db_queries_total", "Çalıştırılan veritabanı sorgusu sayısı", ("app",))
+DB_POOL_WAIT_SECONDS = Histogram("db_pool_wait_seconds", "Bağlantı havuzundan bağlantı alma bekleme süresi")
+PREDICTION_CACHE_REQUESTS = Counter("prediction_cache_requests_total", "Tahmin önbelleği sorguları (hit/miss)",
+                                    ("app", "result"))
+ADMISSION_REQUESTS = Counter("admission_requests_total", "Kabul denetimi kararları (admitted/429/503/too_large)",
+                             ("app", "endpoint_class", "result"))
+ADMISSION_WAIT_SECONDS = Histogram("admission_queue_wait_seconds", "Kabul kuyruğunda bekleme süresi",
+                                   ("app", "endpoint_class"))
+BATCH_SIZE = Histogram("predict_batch_size", "Tek model.predict çağrısındaki satır sayısı",
+                       ("app",), buckets=SIZE_BUCKETS)
+
+
+class StageTimer:
+    # İstek içindeki aşamaları ölçer: her mark("aşama") çağrısı, bir önceki işaretten (ya da
+    # zamanlayıcının oluşturulmasından) bu yana geçen süreyi predict_stage_seconds'a o aşama adıyla yazar.
+    def __init__(self, app_name):
+        self.app_name = app_name
+        self._last = time.perf_counter()
+
+    def mark(self, stage_name):
+        now = time.perf_counter()
+        STAGE_SECONDS.observe(now - self._last, app=self.app_name, stage=stage_name)
+        self._last = now
+
+
+def instrument(app, app_name, engines=()):
+    # Uygulamaya istek süresi ara katmanını ve /metrics uç noktasını ekler,
+    # verilen SQLAlchemy motorlarındaki (senkron veya asenkron) sorguları sayar.
+    # SQLAlchemy yalnızca motor verildiğinde içe aktarılır (main_lean.py onsuz çalışır).
+    if engines:
+        from sqlalchemy import event
+    for engine in engines:
+        engine = getattr(engine, "sync_engine", engine)
+        event.listen(engine, "before_cursor_execute", lambda *args: DB_QUERIES.inc(app=app_name))
+
+    @app.middleware("http")
+    async def record_request_duration(request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")       # Ham URL yerine rota şablonu (etiket sayısı sınırlı kalsın)
+        REQUEST_SECONDS.observe(time.perf_counter() - start, app=app_name,
+                                path=route.path if route else "other", status=response.status_code)
+        return response
+
+    @app.get("/metrics", tags=["Yönetim"], response_class=PlainTextResponse)
+    async def metrics():
+        return REGISTRY.render()
+
+    install_profiler(app)
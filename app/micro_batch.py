@@ -0,0 +1,89 @@
+import asyncio                                  # İstekleri bekletip toplu olarak cevaplamak için
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from app.metrics import BATCH_SIZE
+
+
+# Aynı anda gelen tekil tahmin isteklerini tek bir model.predict çağrısında birleştiren zamanlayıcı.
+# İlk istek geldiğinde window_ms kadarlık bir pencere açılır; pencere dolunca ya da max_batch_size
+# satıra ulaşılınca biriken satırlar tek bir NumPy matrisine dizilir, model bir kez çağrılır ve
+# her sonuç kendi bekleyen isteğine geri dağıtılır. Bir isteğin ek gecikmesi en fazla pencere süresi kadardır.
+# predict() çağrısına ayrıca model fonksiyonu verilebilir: model sıcak değiştirilirken aynı pencereye düşen
+# eski ve yeni sürüm satırları ayrı gruplar halinde, her biri kendi modeliyle tahmin edilir.
+class MicroBatcher:
+    def __init__(self, predict_fn=None, max_batch_size=64, window_ms=2.0, name="micro_batch"):
+        self.name = name                      # predict_batch_size metriğindeki app etiketi
+        self.predict_fn = predict_fn          # 2 boyutlu matris alıp 1 boyutlu tahmin dizisi döndüren fonksiyon
+        self.max_batch_size = max_batch_size
+        self.window_ms = window_ms
+        self._pending = []                    # (özellik satırı, future, tahmin fonksiyonu) üçlüleri
+        self._timer = None
+        self._tasks = set()                   # Süren toplu tahmin görevleri (olay döngüsü görevlere zayıf referans tutar)
+        self.batches = 0                      # Yapılan model.predict çağrısı sayısı
+        self.rows = 0                         # Toplam tahmin edilen satır sayısı
+
+    async def predict(self, row, predict_fn=None):
+        # Tek satırlık özellik vektörünü kuyruğa ekler ve toplu tahminden gelen kendi sonucunu bekler
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future, predict_fn or self.predict_fn))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        groups = {}
+        for row, future, predict_fn in batch:
+            groups.setdefault(predict_fn, []).append((row, future))
+        for predict_fn, group in groups.items():
+            task = asyncio.ensure_future(self._run(predict_fn, group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, predict_fn, batch):
+        # Hata ya da iptal durumunda da her bekleyen isteğin future'ı sonuçlandırılır (istek asılı kalmaz)
+        try:
+            features = np.asarray([row for row, _ in batch])
+            predictions = await run_in_threadpool(predict_fn, features)
+            self.batches += 1
+            self.rows += len(batch)
+            BATCH_SIZE.observe(len(batch), app=self.name)
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():         # İstemci bağlantıyı kapattıysa future iptal edilmiş olabilir
+                    future.set_result(prediction)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def close(self, timeout=10.0):
+        # Kapanışta: pencerede bekleyen satırlar hemen tahmin edilir, süren toplu tahminler timeout saniyeye kadar
+        # beklenir, bitmeyenler iptal edilir
+        if self._pending:
+            self._flush()
+        if not self._tasks:
+            return
+        _, still_running = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in still_running:
+            task.cancel()
+        await asyncio.gather(*still_running, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window_ms,
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0
+        }
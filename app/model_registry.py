@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+import joblib
+import numpy as np
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+
+# Servis sırasında yeniden eğitilen modeli süreci yeniden başlatmadan devreye alan model kaydı.
+# Arka plandaki iş parçacığı izlenen dosyayı (eğitimin en son yazdığı artefakt) yoklar; dosya değişince
+# yeni modeli yükler, birkaç sahte satırla ısıtır ve tek bir atamayla etkin sürüm yapar. İstekler
+# başlarken `registry.active` değerini bir kez alır, böylece bir istek boyunca model ve kod tabloları
+# aynı sürümden gelir; devam eden istekler eski sürümle biter, yenileri yeni sürümü görür.
+# Önceki sürümler bellekte tutulur ve rollback() ile anında geri dönülebilir.
+
+
+def atomic_dump(obj, filename):
+    # Dosyayı önce geçici ada yazar, sonra tek adımda yerine koyar (os.replace). Böylece izleyen süreçler
+    # yarım yazılmış dosya görmez; eski dosyayı mmap ile açmış worker'lar da eski kopyayı okumaya devam eder.
+    tmp_filename = f"{filename}.tmp{os.getpid()}"
+    joblib.dump(obj, tmp_filename)
+    os.replace(tmp_filename, filename)
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_version(path):
+    # Sürüm bilgisi taşımayan artefaktlar (ör. sales_model.pkl) için dosya zamanından UTC sürüm adı
+    return time.strftime("%Y%m%d%H%M%S", time.gmtime(os.path.getmtime(path)))
+
+
+def load_forest_model(engine=None):
+    # app/main.py, main_many_sales.py ve main_lean.py'nin ortak yükleyicisi; (model, kod tabloları) döndürür.
+    # engine (yoksa MODEL_ENGINE) "flat" ise sklearn nesneleri yerine düzleştirilmiş NumPy ormanı (rf_model_flat.joblib)
+    # bellek eşlemeli (mmap) açılır: çok worker'lı çalışmada ağaç dizilerinin tek fiziksel kopyası paylaşılır.
+    if (engine or os.getenv("MODEL_ENGINE", "sklearn")) == "flat":
+        from app.flat_forest import FlatForest      # flat_forest bu modülü içe aktardığından döngüsel içe aktarma olmasın
+        model = FlatForest.load("rf_model_flat.joblib", mmap_mode="r")
+    else:
+        model = joblib.load("rf_model.pkl")
+    # Eğitimde kullanılan ürün/ülke kod tabloları (randomforest_sales.py tarafından en son kaydedilir)
+    return model, joblib.load("rf_encoders.pkl")
+
+
+class ModelVersion:
+    def __init__(self, version, model, artifacts):
+        self.version = version          # Eğitim zamanı (rf_encoders.pkl'deki "version" ya da dosya zamanı)
+        self.model = model
+        self.artifacts = artifacts      # Modelle birlikte kullanılan kod tabloları vb.
+        self.loaded_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    def info(self):
+        return {"version": self.version, "loaded_at": self.loaded_at}
+
+
+class ModelRegistry:
+    def __init__(self, load_fn, watch_path, n_features, history_size=2, name="model"):
+        self.load_fn = load_fn          # (model, artifacts sözlüğü) döndüren yükleme fonksiyonu
+        self.watch_path = watch_path    # Değişince yeni sürümün yükleneceği dosya
+        self.n_features = n_features    # Isıtma satırlarının kolon sayısı
+        self.name = name
+        self._active = None
+        self._signature = None          # İzlenen dosyanın en son işlenen hali (geri almadan etkilenmez)
+        self._history = deque(maxlen=history_size)   # Geri dönülebilecek önceki sürümler (en yenisi sonda)
+        self._lock = threading.Lock()                # Aynı anda tek yükleme / geri alma
+        self._stop = threading.Event()
+        self.swaps = 0
+        self.last_error = None
+
+    @property
+    def active(self):
+        return self._active
+
+    def _load_version(self):
+        model, artifacts = self.load_fn()
+        version = artifacts.get("version") or file_version(self.watch_path)
+        # Isıtma: ilk gerçek istekte tembel başlatma / sayfa hatası maliyeti ödenmesin
+        model.predict(np.zeros((64, self.n_features)))
+        return ModelVersion(version, model, artifacts)
+
+    def load(self):
+        # Açılışta ilk sürümü eşzamanlı yükler (hata olursa uygulama başlamaz)
+        with self._lock:
+            self._signature = file_signature(self.watch_path)
+            self._active = self._load_version()
+        return self._active
+
+    def reload(self, force=False):
+        # İzlenen dosya değiştiyse (ya da force) yeni sürümü yükleyip devreye alır; değiştiyse True döner
+        with self._lock:
+            signature = file_signature(self.watch_path)
+            if not force and signature == self._signature:
+                return False
+            # Yüklenemeyen dosya, yeniden yazılana kadar tekrar denenmez (force hariç)
+            self._signature = signature
+            candidate = self._load_version()
+            if self._active is not None:         # Açılış yüklemesi bitmeden yapılan ilk yükleme geçmişe yazılmaz
+                self._history.append(self._active)
+            self._active = candidate             # Tek atama: istekler ya eski ya yeni sürümü görür
+            self.swaps += 1
+            return True
+
+    def rollback(self, version=None):
+        # Bir önceki (ya da adı verilen) sürüme döner; dönülen sürümden sonrakiler geçmişten çıkarılır.
+        # İzlenen dosya yeniden yazılmadıkça geri alınan sürüm tekrar yüklenmez.
+        with self._lock:
+            versions = [v.version for v in self._history]
+            if not versions or (version is not None and version not in versions):
+                raise ValueError(f"Geri dönülebilecek sürüm yok: {version or 'önceki'}")
+            while True:
+                previous = self._history.pop()
+                if version is None or previous.version == version:
+                    break
+            self._active = previous
+            self.swaps += 1
+            return previous
+
+    def start_watching(self, interval_seconds):
+        # Belirtilen aralıklarla reload() çağıran arka plan iş parçacığı başlatır (0 → kapalı)
+        if interval_seconds <= 0:
+            return None
+
+        def loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.reload()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                    print("Yeni model yüklenemedi, etkin sürüm korunuyor:", e)
+
+        thread = threading.Thread(target=loop, name=f"{self.name}-registry", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "active": self._active.info() if self._active else None,
+            "history": [v.info() for v in reversed(self._history)],
+            "watch_path": self.watch_path,
+            "swaps": self.swaps,
+            "last_error": self.last_error
+        }
+
+
+def install_model_admin(app, registry):
+    # Etkin sürümü gösteren, elle yeniden yükleme ve geri alma yapan yönetim uç noktalarını ekler.
+    # Çok worker'lı çalışmada her worker kendi kaydını tutar; POST istekleri yalnızca isteği alan worker'ı etkiler.
+    @app.get("/admin/model", tags=["Yönetim"])
+    async def model_stats():
+        return registry.stats()
+
+    @app.post("/admin/model/reload", tags=["Yönetim"])
+    async def model_reload(force: bool = False):
+        try:
+            swapped = await run_in_threadpool(registry.reload, force)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Model yüklenemedi: {str(e)}")
+        return {"degisti": swapped, **registry.stats()}
+
+    @app.post("/admin/model/rollback", tags=["Yönetim"])
+    async def model_rollback(version: str = None):
+        try:
+            registry.rollback(version)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return registry.stats()
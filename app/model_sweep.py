@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from sklearn.model_selection import ParameterGrid, TimeSeriesSplit
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.tree import DecisionTreeRegressor
+from sklearn.ensemble import RandomForestRegressor, ExtraTreesRegressor, HistGradientBoostingRegressor
+from sklearn.metrics import r2_score, mean_squared_error
+
+
+# Model ailesi ve hiperparametre taraması:
+#   1) Eğitim verisi (randomforest_sales: sipariş satırları, train_model: aylık satışlar) bir kez hazırlanır,
+#      zamana göre sıralanır ve paylaşılan belleğe (SharedMemory) konur
+#   2) Zaman tabanlı katlar (TimeSeriesSplit, ay sınırlarında): her katta geçmiş aylarla eğitilip sonraki
+#      aylarda ölçülür. Veri zamana göre sıralı olduğu için katlar yalnızca satır aralıklarıdır (kopya yok)
+#   3) Her aday (aile × parametre kombinasyonu) bir süreç havuzunda değerlendirilir; işçiler veriyi
+#      kopyalamadan paylaşılan bellekten okur
+#   4) Ortalama RMSE / R2, eğitim süresi ve tahmin gecikmesi (tek satır ve satır başına toplu) raporlanır;
+#      --rmse-target verilirse hedefi karşılayan en hızlı model önerilir
+#
+# Kullanım: python -m app.model_sweep [--dataset lines|monthly] [--folds 4] [--rmse-target 250] [--output sweep.json]
+# Not: gecikmeler işçiler paralel çalışırken ölçülür; karşılaştırma için yeterli, mutlak değer için --jobs 1 kullanın.
+
+MODEL_FAMILIES = {
+    "linear": (LinearRegression, {}),
+    "ridge": (Ridge, {"alpha": [0.1, 1.0, 10.0]}),
+    "decision_tree": (DecisionTreeRegressor, {"max_depth": [6, 10, None], "random_state": [42]}),
+    "random_forest": (RandomForestRegressor, {"n_estimators": [50, 100], "max_depth": [12, None],
+                                              "random_state": [42], "n_jobs": [1]}),
+    "extra_trees": (ExtraTreesRegressor, {"n_estimators": [100], "max_depth": [12, None],
+                                          "random_state": [42], "n_jobs": [1]}),
+    "hist_gradient_boosting": (HistGradientBoostingRegressor, {"max_iter": [100, 300], "learning_rate": [0.05, 0.1],
+                                                               "random_state": [42]}),
+}
+
+
+def load_dataset(name):
+    # (X, y, ay indeksi) döndürür; eğitim betikleriyle aynı özellikler kullanılır
+    if name == "lines":
+        from app.randomforest_sales import load_data, create_features
+        df = create_features(load_data())
+        X = df.drop(columns=["sales"]).to_numpy(dtype=np.float64)
+        y = df["sales"].to_numpy(dtype=np.float64)
+        month_idx = df["year"].to_numpy(dtype=np.int64) * 12 + df["month"].to_numpy(dtype=np.int64) - 1
+    elif name == "monthly":
+        from app.train_model import load_monthly_sales, build_training_frame
+        df = build_training_frame(load_monthly_sales())
+        X = df[['order_month_num', 'product_code', 'unit_price', 'month_only',
+                'prev_month_sales', 'sales_rolling_3']].to_numpy(dtype=np.float64)
+        y = df["total_quantity"].to_numpy(dtype=np.float64)
+        month_idx = (df["order_month_num"] // 100).to_numpy(dtype=np.int64) * 12 + df["month_only"].to_numpy() - 1
+    else:
+        raise ValueError(f"Bilinmeyen veri kümesi: {name}")
+    return X, y, month_idx
+
+
+def time_folds(month_idx, n_folds):
+    # Sıralı ay indeksinden (eğitim_bitiş, test_bitiş) satır aralıkları: eğitim = [0, eğitim_bitiş),
+    # test = [eğitim_bitiş, test_bitiş). Katlar ay sınırında bölünür, aynı ay iki tarafa düşmez.
+    months = np.unique(month_idx)
+    folds = []
+    for train_months, test_months in TimeSeriesSplit(n_splits=n_folds).split(months):
+        train_end = int(np.searchsorted(month_idx, months[test_months[0]], side="left"))
+        test_end = int(np.searchsorted(month_idx, months[test_months[-1]], side="right"))
+        folds.append((train_end, test_end))
+    return folds
+
+
+def share_array(array):
+    shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+_shared = {}
+
+
+def _attach(specs):
+    # İşçi süreç başlatıcısı: paylaşılan bellekteki X ve y'ye kopyasız NumPy görünümü açar
+    for key, (name, shape, dtype) in specs.items():
+        # İşçiler ana sürecin kaynak izleyicisini paylaşır; belleği yalnızca ana süreç siler (sweep sonunda)
+        shm = SharedMemory(name=name)
+        _shared[key] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+
+def evaluate(family, params, folds, latency_repeats=200):
+    X, y = _shared["X"][1], _shared["y"][1]
+    model_class = MODEL_FAMILIES[family][0]
+    rmses, r2s, fit_seconds = [], [], 0.0
+    for train_end, test_end in folds:
+        model = model_class(**params)
+        start = time.perf_counter()
+        model.fit(X[:train_end], y[:train_end])
+        fit_seconds += time.perf_counter() - start
+        y_pred = model.predict(X[train_end:test_end])
+        rmses.append(float(np.sqrt(mean_squared_error(y[train_end:test_end], y_pred))))
+        r2s.append(float(r2_score(y[train_end:test_end], y_pred)))
+
+    # Gecikme son katın modeliyle ölçülür: tekil istek (/predict) ve toplu istek (/predict/batch) senaryoları
+    test = X[folds[-1][0]:folds[-1][1]]
+    row = test[:1]
+    start = time.perf_counter()
+    for _ in range(latency_repeats):
+        model.predict(row)
+    single_ms = (time.perf_counter() - start) / latency_repeats * 1000
+    start = time.perf_counter()
+    model.predict(test)
+    per_row_us = (time.perf_counter() - start) / len(test) * 1e6
+
+    return {
+        "family": family,
+        "params": {k: v for k, v in params.items() if k not in ("random_state", "n_jobs")},
+        "rmse": round(float(np.mean(rmses)), 3),
+        "rmse_std": round(float(np.std(rmses)), 3),
+        "r2": round(float(np.mean(r2s)), 4),
+        "fit_seconds": round(fit_seconds, 3),
+        "predict_single_ms": round(single_ms, 3),
+        "predict_per_row_us": round(per_row_us, 3)
+    }
+
+
+def sweep(dataset="lines", n_folds=4, families=None, jobs=None):
+    X, y, month_idx = load_dataset(dataset)
+    order = np.argsort(month_idx, kind="stable")              # Zamana göre sırala (katlar ardışık aralık olur)
+    X, y, month_idx = np.ascontiguousarray(X[order]), y[order], month_idx[order]
+    folds = time_folds(month_idx, n_folds)
+    print(f"{dataset}: {len(X):,} satır, {X.shape[1]} özellik, {len(np.unique(month_idx))} ay, "
+          f"katlar (eğitim_bitiş, test_bitiş): {folds}")
+
+    tasks = [(family, params) for family in (families or MODEL_FAMILIES)
+             for params in ParameterGrid(MODEL_FAMILIES[family][1])]
+
+    shared = [share_array(X), share_array(y)]
+    specs = {"X": shared[0][1], "y": shared[1][1]}
+    try:
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count(), mp_context=get_context("spawn"),
+                                 initializer=_attach, initargs=(specs,)) as pool:
+            futures = [pool.submit(evaluate, family, params, folds) for family, params in tasks]
+            results = [future.result() for future in futures]
+    finally:
+        for shm, _ in shared:
+            shm.close()
+            shm.unlink()
+    return sorted(results, key=lambda r: r["rmse"])
+
+
+def recommend(results, rmse_target):
+    # Hedef RMSE'yi karşılayanlar arasında tekil tahmin gecikmesi en düşük olan model
+    eligible = [r for r in results if r["rmse"] <= rmse_target]
+    return min(eligible, key=lambda r: r["predict_single_ms"]) if eligible else None
+
+
+def print_results(results):
+    print(f"\n{'model':<24}{'rmse':>10}{'r2':>9}{'fit_s':>9}{'1 satır ms':>12}{'satır başı µs':>15}  parametreler")
+    for r in results:
+        print(f"{r['family']:<24}{r['rmse']:>10.2f}{r['r2']:>9.4f}{r['fit_seconds']:>9.2f}"
+              f"{r['predict_single_ms']:>12.3f}{r['predict_per_row_us']:>15.3f}  {r['params']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Model ailesi ve hiperparametre taraması (zaman tabanlı katlar)")
+    parser.add_argument("--dataset", choices=["lines", "monthly"], default="lines",
+                        help="lines = randomforest_sales özellikleri, monthly = train_model özellikleri")
+    parser.add_argument("--folds", type=int, default=4, help="Zaman tabanlı kat sayısı")
+    parser.add_argument("--families", nargs="*", choices=list(MODEL_FAMILIES), help="Yalnızca bu aileler")
+    parser.add_argument("--jobs", type=int, help="İşçi süreç sayısı (varsayılan: çekirdek sayısı)")
+    parser.add_argument("--rmse-target", type=float, help="Bu RMSE'yi karşılayan en hızlı modeli öner")
+    parser.add_argument("--output", help="Sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args()
+
+    results = sweep(args.dataset, args.folds, args.families, args.jobs)
+    print_results(results)
+    if args.rmse_target is not None:
+        best = recommend(results, args.rmse_target)
+        if best is None:
+            print(f"\nRMSE <= {args.rmse_target} hedefini karşılayan model yok.")
+        else:
+            print(f"\nÖneri (RMSE <= {args.rmse_target}, en düşük tekil gecikme): {best['family']} {best['params']} "
+                  f"→ RMSE {best['rmse']:.2f}, {best['predict_single_ms']:.3f} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,50 @@
+from app.product_cache import ProductCache
+from app.metrics import PREDICTION_CACHE_REQUESTS
+
+
+# Aynı özellik vektörü için model.predict'i tekrar çalıştırmamak üzere tahmin sonuçlarını tutan önbellek
+# (ör. aynı ayı yenileyen panolar). Anahtar (model sürümü, nihai özellik demeti) olduğundan ürün bilgisi ya da
+# gecikme özellikleri değişince yeni bir anahtar oluşur. Boyut sınırı ve LRU atma ProductCache'ten gelir.
+# Kayıttaki etkin sürüm değiştiğinde (yeni model ya da geri alma) önbellek bir sonraki erişimde boşaltılır;
+# geçiş sırasında eski sürümle biten isteklerin sonuçları saklanmaz.
+class PredictionCache(ProductCache):
+    def __init__(self, registry, max_size=10000, ttl_seconds=0, name="model"):
+        super().__init__(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.registry = registry
+        self.name = name                # /metrics'teki app etiketi
+        self.version = None             # Kayıtların ait olduğu model sürümü
+        self.invalidations = 0
+
+    def _sync_version(self):
+        version = self.registry.active.version
+        if version != self.version:
+            if self.clear():
+                self.invalidations += 1
+            self.version = version
+
+    def lookup(self, version, features):
+        self._sync_version()
+        value = self.get((version, features))
+        PREDICTION_CACHE_REQUESTS.inc(app=self.name, result="hit" if value is not None else "miss")
+        return value
+
+    def store(self, version, features, value):
+        if version == self.version:
+            self.set((version, features), value)
+
+    def stats(self):
+        return {**super().stats(), "model_version": self.version, "invalidations": self.invalidations}
+
+
+def install_prediction_cache_admin(app, cache):
+    # Önbellek kapalıysa (cache None) uç noktalar eklenmez
+    if cache is None:
+        return
+
+    @app.get("/admin/prediction-cache", tags=["Yönetim"])
+    async def prediction_cache_stats():
+        return cache.stats()
+
+    @app.post("/admin/prediction-cache/clear", tags=["Yönetim"])
+    async def prediction_cache_clear():
+        return {"temizlenen_kayit": cache.clear()}
@@ -0,0 +1,74 @@
+from collections import OrderedDict           # LRU sırası için ekleme/erişim sırasını tutan sözlük
+import threading                                # Aynı anda gelen isteklerde önbelleği korumak için
+import time                                     # TTL hesabı için monotonic saat
+
+
+# Ürün bilgisi (ürün adı, ülke vb.) modeller yeniden eğitilene kadar neredeyse hiç değişmez.
+# Bu sınıf, product_id → değer eşlemesini süreç içinde tutan, boyutu sınırlı (LRU) ve
+# süreli (TTL) bir önbellektir. Sık sorulan bir ürün veritabanına gitmeden tek bir sözlük
+# erişimiyle çözülür.
+class ProductCache:
+    def __init__(self, max_size=1024, ttl_seconds=600):
+        self.max_size = max_size          # En fazla kaç ürün tutulacağı (aşılırsa en eski kullanılan silinir)
+        self.ttl_seconds = ttl_seconds    # Bir kaydın kaç saniye geçerli kalacağı (0 → süresiz)
+        self._data = OrderedDict()        # product_id → (kayıt zamanı, değer)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, product_id):
+        # Kayıt varsa ve süresi dolmamışsa değeri döndürür, yoksa None döner
+        with self._lock:
+            entry = self._data.get(product_id)
+            if entry is not None:
+                stored_at, value = entry
+                if self.ttl_seconds <= 0 or time.monotonic() - stored_at < self.ttl_seconds:
+                    self._data.move_to_end(product_id)   # En son kullanılan olarak işaretlenir
+                    self.hits += 1
+                    return value
+                del self._data[product_id]               # Süresi dolan kayıt silinir
+            self.misses += 1
+            return None
+
+    def set(self, product_id, value):
+        with self._lock:
+            self._data[product_id] = (time.monotonic(), value)
+            self._data.move_to_end(product_id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)           # En uzun süredir kullanılmayan kayıt atılır
+
+    def get_or_load(self, product_id, loader):
+        # Önbellekte yoksa loader(product_id) çağrılır; None dönerse (ürün bulunamadı) saklanmaz
+        value = self.get(product_id)
+        if value is None:
+            value = loader(product_id)
+            if value is not None:
+                self.set(product_id, value)
+        return value
+
+    async def get_or_load_async(self, product_id, loader):
+        # get_or_load'un asenkron hali: loader bir coroutine fonksiyonudur (ör. asyncpg sorgusu)
+        value = self.get(product_id)
+        if value is None:
+            value = await loader(product_id)
+            if value is not None:
+                self.set(product_id, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            removed = len(self._data)
+            self._data.clear()
+            return removed
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
@@ -0,0 +1,41 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+
+# İsteğe bağlı örnekleme profilleyicisi (ENABLE_PROFILER=1).
+# Belirtilen süre boyunca her interval_ms'de bir tüm iş parçacıklarının çağrı yığınlarını
+# (sys._current_frames) okur ve "dosya:fonksiyon;dosya:fonksiyon adet" biçiminde katlanmış yığınlar
+# döndürür. Çıktı flamegraph.pl veya speedscope ile görselleştirilebilir.
+
+def sample_stacks(seconds=5.0, interval_ms=5.0):
+    own_thread = threading.get_ident()
+    stacks = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stacks[";".join(reversed(names))] += 1
+        time.sleep(interval_ms / 1000)
+    return stacks
+
+
+def install_profiler(app):
+    # ENABLE_PROFILER=1 değilse hiçbir şey eklenmez (üretimde varsayılan olarak kapalıdır)
+    if os.getenv("ENABLE_PROFILER", "0") != "1":
+        return
+
+    @app.get("/debug/profile", tags=["Yönetim"], response_class=PlainTextResponse)
+    async def profile(seconds: float = 5.0, interval_ms: float = 5.0):
+        stacks = await run_in_threadpool(sample_stacks, min(seconds, 60.0), max(interval_ms, 1.0))
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
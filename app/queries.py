@@ -0,0 +1,35 @@
+# Servis sırasında sık çalışan (sıcak) sorgular tek yerde tutulur.
+# Hepsi sabit metinli ve bağlama parametreli (:product_id, :product_ids, :since) olduğundan asyncpg
+# her bağlantıda sorguyu bir kez hazırlar (prepared statement) ve sonraki isteklerde planı yeniden kullanır.
+# Tarih filtreleri kolon üzerinde fonksiyon çağırmadan (TO_CHAR/DATE_TRUNC yerine) yarı açık aralık
+# olarak yazılır: order_date >= başlangıç [AND order_date < bitiş]; böylece orders(order_date) indeksi kullanılabilir.
+# Gerekli indeksler ve EXPLAIN kontrolü: app/db_indexes.py
+
+# main.py: ürünün adı ve en son siparişinin ülkesi
+PRODUCT_LATEST_ORDER_QUERY = """
+    SELECT p.product_name, c.country
+    FROM products p
+    JOIN order_details od ON p.product_id = od.product_id
+    JOIN orders o ON od.order_id = o.order_id
+    JOIN customers c ON o.customer_id = c.customer_id
+    WHERE p.product_id = :product_id
+    ORDER BY o.order_date DESC
+    LIMIT 1
+"""
+
+# main_many_sales.py: batch'teki her ürünün en son siparişi tek sorguda (DISTINCT ON)
+PRODUCTS_LATEST_ORDER_QUERY = """
+    SELECT DISTINCT ON (p.product_id) p.product_id, p.product_name, c.country
+    FROM products p
+    JOIN order_details od ON p.product_id = od.product_id
+    JOIN orders o ON od.order_id = o.order_id
+    JOIN customers c ON o.customer_id = c.customer_id
+    WHERE p.product_id = ANY(:product_ids)
+    ORDER BY p.product_id, o.order_date DESC
+"""
+
+# mainold.py: ürün adı
+PRODUCT_NAME_QUERY = "SELECT product_name FROM products WHERE product_id = :product_id"
+
+# Artımlı yenilemelerde (feature_store, feature_cache) sipariş satırı sorgularına eklenen filtre: [since, ∞)
+SINCE_FILTER = " WHERE o.order_date >= :since"
@@ -1,12 +1,18 @@
 import pandas as pd
 import numpy as np
+import joblib
 from sqlalchemy import create_engine
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import r2_score, mean_squared_error
-import joblib
 from dotenv import load_dotenv
 import os
+from datetime import datetime, timezone
+from app.flat_forest import FlatForest
+from app.model_registry import atomic_dump
+from app.streaming import stream_line_features
+from app.features import line_features, encode_lines, encoder_table, FEATURE_COLUMNS
+from app.feature_cache import LineFeatureCache
 
 # Ortam değişkenlerini yükle
 load_dotenv()
@@ -15,9 +21,7 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 # Veritabanı bağlantısı
 engine = create_engine(DATABASE_URL)
 
-# Veritabanı bağlantısı
-def load_data():
-    query = """
+DATA_QUERY = """
     SELECT o.order_date, od.product_id, od.quantity, od.unit_price,
            c.country, p.product_name
     FROM order_details od
@@ -25,45 +29,32 @@ def load_data():
     JOIN customers c ON o.customer_id = c.customer_id
     JOIN products p ON od.product_id = p.product_id
     """
-    df = pd.read_sql(query, engine)
+
+# Veritabanı bağlantısı
+def load_data():
+    df = pd.read_sql(DATA_QUERY, engine)
     return df
 
-# Özellik mühendisliği
+# Büyük sipariş geçmişi için: veri parça parça okunur ve doğrudan küçük sayısal kolonlara çevrilir
+# (create_features ile aynı çıktı, ham DataFrame hiç oluşturulmaz). Kategorik kod tabloları da döner.
+def load_features_chunked(chunksize):
+    return stream_line_features(engine, DATA_QUERY, chunksize=chunksize)
+
+# Özellik mühendisliği (vektörel; toplu tahmin servisiyle aynı fonksiyonlar kullanılır)
 def create_features(df):
-    df["sales"] = df["quantity"] * df["unit_price"]
-    df["sales"] = df["sales"].fillna(0).apply(lambda x: max(x, 0))
-
-    df["order_date"] = pd.to_datetime(df["order_date"])
-    df["month"] = df["order_date"].dt.month
-    df["year"] = df["order_date"].dt.year
-    df["day_of_week"] = df["order_date"].dt.dayofweek
-
-    def get_season(month):
-        if month in [3, 4, 5]:
-            return 1
-        elif month in [6, 7, 8]:
-            return 2
-        elif month in [9, 10, 11]:
-            return 3
-        else:
-            return 4
-    df["season"] = df["month"].apply(get_season)
-
-    df["country_code"] = df["country"].astype("category").cat.codes
-    df["product_code"] = df["product_name"].astype("category").cat.codes
-    df["avg_price"] = df.groupby("product_code")["unit_price"].transform("mean")
-    df["log_sales"] = np.log1p(df["sales"])
-
-    df = df.dropna()
-
-    features = [
-        "month", "year", "day_of_week", "season",
-        "country_code", "product_code",
-        "quantity", "unit_price", "avg_price",
-        "sales"  # veya "log_sales"
-    ]
-
-    return df[features]
+    df = line_features(df)
+    return df[FEATURE_COLUMNS + ["sales"]]
+
+# Eğitimde kullanılan kategorik kodların tabloları (servis aynı kodları bu tablolardan okur)
+def build_encoders(raw_df):
+    return {
+        "product_code": encoder_table(raw_df["product_name"]),
+        "country_code": encoder_table(raw_df["country"])
+    }
+
+# Ağaçlar TRAIN_N_JOBS çekirdekte paralel eğitilir (-1 = tüm çekirdekler)
+def training_jobs():
+    return int(os.getenv("TRAIN_N_JOBS", "-1"))
 
 # Model eğitimi ve korelasyon analizi
 def train_model(df):
@@ -75,7 +66,7 @@ def train_model(df):
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=training_jobs())
     model.fit(X_train, y_train)
 
     y_pred = model.predict(X_test)
@@ -87,16 +78,110 @@ def train_model(df):
     
     return model, r2, rmse
 
-# Modeli kaydet
-def save_model(model, filename="rf_model.pkl"):
-    joblib.dump(model, filename)
+# Ağaç eklemek için gereken en az yeni satır: %20 test ayrımında en az 2 test satırı kalsın (R2 tanımlı olsun)
+GROW_MIN_ROWS = 10
+
+# Mevcut ormana yalnızca yeni aylardaki satırlarla eğitilen n_trees ağaç eklenir (warm_start).
+# Eski ağaçlar olduğu gibi kalır; başarı yeni satırların ayrılmış %20'si üzerinde ölçülür.
+def grow_model(model, new_df, n_trees):
+    if len(new_df) < GROW_MIN_ROWS:
+        raise ValueError(f"Ağaç eklemek için en az {GROW_MIN_ROWS} yeni satır gerekir ({len(new_df)} var).")
+    X = new_df.drop(columns=["sales"])
+    y = new_df["sales"]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + n_trees, n_jobs=training_jobs())
+    model.fit(X_train, y_train)
+
+    y_pred = model.predict(X_test)
+    r2 = r2_score(y_test, y_pred)
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+    print(f"\n{n_trees} ağaç eklendi (toplam {model.n_estimators}). Yeni aylarda R2: {r2:.4f}, RMSE: {rmse:.2f}")
+    return model, r2, rmse
+
+# Modeli kaydet (servis için düzleştirilmiş NumPy kopyası da yazılır)
+def save_model(model, filename="rf_model.pkl", flat_filename="rf_model_flat.joblib"):
+    # Eğitimdeki paralellik ayarı servise taşınmaz: tekil tahminlerde iş parçacığı havuzu açılmasın
+    model.set_params(n_jobs=None, warm_start=False)
+    atomic_dump(model, filename)
+    FlatForest.from_sklearn(model).save(flat_filename)
+
+# Ürün ve ülke kod tablolarını sürüm bilgisiyle kaydet (train_model.py'deki product_code_map.pkl gibi).
+# Servisteki model kaydı bu dosyayı izler; bu yüzden modelden sonra, en son yazılır.
+def save_encoders(encoders, filename="rf_encoders.pkl"):
+    encoders = dict(encoders, version=datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"))
+    atomic_dump(encoders, filename)
+
+# Artımlı eğitim: sipariş satırları TRAIN_CACHE_DIR altındaki aylık Parquet önbelleğinden okunur, veritabanından
+# yalnızca son işlenen aydan sonraki siparişler çekilir. Kod tabloları değişmediyse (yeni ürün/ülke yoksa) ve
+# orman TRAIN_MAX_ESTIMATORS sınırını aşmayacaksa mevcut modele yeni aylarla TRAIN_WARM_START_TREES ağaç eklenir;
+# aksi halde tüm önbellekten sıfırdan eğitilir. Önbellekteki tüm aylar yeni/değişen sayılıyorsa (ör. normal bir tam
+# eğitimden sonraki ilk artımlı çalıştırma, önbellek boş) ağaç eklenmez, yine sıfırdan eğitilir: eklenecek ağaçlar
+# tüm geçmişi öğrenir ve başarı mevcut ağaçların zaten gördüğü satırlarda ölçülmüş olurdu.
+def train_incremental(chunksize=0):
+    cache = LineFeatureCache(os.getenv("TRAIN_CACHE_DIR", "feature_cache"))
+    changed_months = cache.update(engine, DATA_QUERY, chunksize)
+    lines = cache.load()
+    encoders = {
+        "product_code": encoder_table(lines["product_name"]),
+        "country_code": encoder_table(lines["country"])
+    }
+    df = encode_lines(lines)[FEATURE_COLUMNS + ["sales"]]
+    print(f"Önbellek: {len(cache.manifest['months'])} ay, watermark {cache.watermark}, "
+          f"yeni/değişen aylar: {changed_months or 'yok'}")
+
+    previous_model, previous_encoders = None, None
+    if os.path.exists("rf_model.pkl") and os.path.exists("rf_encoders.pkl"):
+        if not changed_months:
+            cache.commit()
+            return {"status": "Yeni sipariş yok, model değiştirilmedi."}
+        previous_model = joblib.load("rf_model.pkl")
+        previous_encoders = joblib.load("rf_encoders.pkl")
+
+    n_trees = int(os.getenv("TRAIN_WARM_START_TREES", "20"))
+    can_grow = (
+        previous_model is not None and n_trees > 0
+        and previous_encoders["product_code"] == encoders["product_code"]
+        and previous_encoders["country_code"] == encoders["country_code"]
+        and previous_model.n_estimators + n_trees <= int(os.getenv("TRAIN_MAX_ESTIMATORS", "300"))
+        and len(changed_months) < len(cache.manifest["months"])
+    )
+    if can_grow:
+        order_month = df["year"].astype(str) + "-" + df["month"].astype(str).str.zfill(2)
+        new_df = df[order_month.isin(changed_months).to_numpy()]
+        if len(new_df) < GROW_MIN_ROWS:
+            # Manifest yazılmaz: bu satırlar sonraki çalıştırmada gelen yeni satırlarla birlikte tekrar denenir
+            return {"status": f"Yeni satır sayısı ({len(new_df)}) ağaç eklemek için az "
+                              f"(en az {GROW_MIN_ROWS}), model değiştirilmedi."}
+        model, r2, rmse = grow_model(previous_model, new_df, n_trees)
+    else:
+        model, r2, rmse = train_model(df)
+    save_model(model)
+    save_encoders(encoders)
+    # Yeni aylar ancak model kaydedildikten sonra işlenmiş sayılır (eğitim hata verirse sonraki çalıştırma tekrar dener)
+    cache.commit()
+    return {"R2": round(r2, 4), "RMSE": round(rmse, 2), "n_estimators": model.n_estimators,
+            "status": "Model artımlı olarak güncellendi." if can_grow else "Model başarıyla kaydedildi."}
 
 # Ana akış
-def main():
-    raw_df = load_data()
-    df = create_features(raw_df)
+# TRAIN_CHUNKSIZE > 0 ise veri sunucu tarafı imleçle bu kadar satırlık parçalar halinde okunur
+# TRAIN_INCREMENTAL=1 ise önbellekli artımlı eğitim kullanılır (train_incremental)
+def main(chunksize=None, incremental=None):
+    if chunksize is None:
+        chunksize = int(os.getenv("TRAIN_CHUNKSIZE", "0"))
+    if incremental is None:
+        incremental = os.getenv("TRAIN_INCREMENTAL", "0") == "1"
+    if incremental:
+        return train_incremental(chunksize)
+    if chunksize > 0:
+        df, encoders = load_features_chunked(chunksize)
+    else:
+        raw_df = load_data()
+        encoders = build_encoders(raw_df)
+        df = create_features(raw_df)
     model, r2, rmse = train_model(df)  # bu satır artık tamam
     save_model(model)
+    save_encoders(encoders)
     return {"R2": round(r2, 4), "RMSE": round(rmse, 2), "status": "Model başarıyla kaydedildi."}
 
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from app.feature_store import ORDER_LINES_QUERY
+from app.features import date_features
+
+
+# Eğitim verisini tek seferde belleğe almak yerine sunucu tarafı imleç (stream_results) ile
+# chunksize satırlık parçalar halinde okuyan yardımcılar. Her parça işlenip özetlendikten sonra
+# bırakılır; böylece en yüksek bellek kullanımı sipariş satırı sayısıyla değil, özetin boyutuyla büyür.
+
+
+def iter_chunks(engine, query, chunksize, params=None):
+    # PostgreSQL'de stream_results=True sunucu tarafı (isimli) imleç açar; satırlar parça parça gelir
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(text(query), conn, params=params or {}, chunksize=chunksize):
+            yield chunk
+
+
+def stream_monthly_sales(engine, chunksize=50000):
+    # compute_monthly_sales ile aynı tabloyu (product_id, product_name, order_month, total_quantity,
+    # unit_price) üretir, ancak her parçada yalnızca ürün × ay bazında toplam/adet biriktirir.
+    partial = None
+    for chunk in iter_chunks(engine, ORDER_LINES_QUERY, chunksize):
+        chunk = chunk.dropna(subset=['order_date', 'quantity', 'unit_price'])
+        chunk = chunk.assign(order_month=pd.to_datetime(chunk['order_date']).dt.to_period('M').astype(str))
+        sums = chunk.groupby(['product_id', 'product_name', 'order_month']).agg(
+            total_quantity=('quantity', 'sum'),
+            price_sum=('unit_price', 'sum'),
+            price_count=('unit_price', 'count')
+        )
+        partial = sums if partial is None else partial.add(sums, fill_value=0)
+
+    if partial is None:
+        return pd.DataFrame(columns=['product_id', 'product_name', 'order_month', 'total_quantity', 'unit_price'])
+
+    partial['unit_price'] = partial['price_sum'] / partial['price_count']
+    return partial.drop(columns=['price_sum', 'price_count']).reset_index()
+
+
+class _Codes:
+    # Kategorik değerlere parça parça geçici kod verir; sonunda pandas'ın category kodlarıyla
+    # (sıralı benzersiz değerler) aynı olacak şekilde yeniden numaralandırır.
+    def __init__(self):
+        self.index = {}
+
+    def encode(self, values):
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            if value is None or value != value:          # None / NaN → -1
+                codes[i] = -1
+            else:
+                codes[i] = self.index.setdefault(value, len(self.index))
+        return codes
+
+    def finalize(self, codes):
+        ordered = sorted(self.index)
+        remap = np.empty(len(ordered) + 1, dtype=np.int32)
+        remap[-1] = -1
+        for final_code, value in enumerate(ordered):
+            remap[self.index[value]] = final_code
+        return remap[codes]
+
+    def table(self):
+        return {value: code for code, value in enumerate(sorted(self.index))}
+
+
+def stream_line_features(engine, query, chunksize=50000):
+    # randomforest_sales.create_features ile aynı kolonları üretir. Random Forest her sipariş satırını
+    # ayrı bir örnek olarak kullandığı için satırlar tutulur, ama ham DataFrame (metin, tarih, nesne
+    # kolonları) yerine parça parça küçük sayısal dizilere çevrilerek saklanır.
+    # Dönüş: (özellik tablosu, {"product_code": {ürün adı: kod}, "country_code": {ülke: kod}})
+    countries, products = _Codes(), _Codes()
+    price_sum, price_count = {}, {}                       # Ürün bazında ortalama fiyat için
+    parts = []
+
+    for chunk in iter_chunks(engine, query, chunksize):
+        quantity = chunk['quantity'].to_numpy(dtype=np.float64)
+        unit_price = chunk['unit_price'].to_numpy(dtype=np.float64)
+        sales = np.nan_to_num(quantity * unit_price, nan=0.0).clip(min=0)
+
+        product_codes = products.encode(chunk['product_name'].tolist())
+        country_codes = countries.encode(chunk['country'].tolist())
+        prices = chunk[['product_name', 'unit_price']].dropna()
+        for name, group in prices.groupby('product_name')['unit_price']:
+            price_sum[name] = price_sum.get(name, 0.0) + group.sum()
+            price_count[name] = price_count.get(name, 0) + len(group)
+
+        # create_features'taki gibi eksik değer içeren satırlar atılır
+        keep = chunk.notna().all(axis=1).to_numpy()
+        part = date_features(pd.to_datetime(chunk['order_date'][keep]))
+        part.update({
+            "country_code": country_codes[keep],
+            "product_code": product_codes[keep],
+            "quantity": quantity[keep].astype(np.float32),
+            "unit_price": unit_price[keep].astype(np.float32),
+            "sales": sales[keep]
+        })
+        parts.append(part)
+
+    columns = ["month", "year", "day_of_week", "season", "country_code", "product_code",
+               "quantity", "unit_price", "sales"]
+    data = {col: np.concatenate([p[col] for p in parts]) if parts else np.empty(0) for col in columns}
+    data["country_code"] = countries.finalize(data["country_code"].astype(np.int32))
+    data["product_code"] = products.finalize(data["product_code"].astype(np.int32))
+
+    # Ürün ortalama fiyatı, ürün kodu üzerinden dizi indeksiyle satırlara dağıtılır
+    ordered = sorted(products.index)
+    avg_by_code = np.array([price_sum.get(name, 0.0) / max(price_count.get(name, 0), 1) for name in ordered],
+                           dtype=np.float64).astype(np.float32)
+    avg_price = avg_by_code[data["product_code"]] if len(ordered) else np.empty(0)
+
+    df = pd.DataFrame(data)
+    df.insert(df.columns.get_loc("sales"), "avg_price", avg_price)
+    return df, {"product_code": products.table(), "country_code": countries.table()}
@@ -5,9 +5,11 @@ import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import r2_score, mean_squared_error
-import joblib
 from dotenv import load_dotenv
 import os
+from app.feature_store import compute_monthly_sales
+from app.streaming import stream_monthly_sales
+from app.model_registry import atomic_dump
 
 # Veritabanı bağlantısı
 load_dotenv()
@@ -35,25 +37,21 @@ class OrderDetail(Base):
     product_id = Column('product_id', Integer, primary_key=True)
     quantity = Column('quantity', Integer)
 
-def train_and_save_model():
+def load_monthly_sales():
     # Veri çekme
     products_df = pd.read_sql(session.query(Product).statement, engine)
     orders_df = pd.read_sql(session.query(Order).statement, engine)
     order_details_df = pd.read_sql(session.query(OrderDetail).statement, engine)
 
     # Veri ön işleme
-    orders_df['order_date'] = pd.to_datetime(orders_df['order_date'])
-    orders_df['order_month'] = orders_df['order_date'].dt.to_period('M').astype(str)
-
     merged = pd.merge(order_details_df, orders_df, on='order_id')
     merged = pd.merge(merged, products_df, on='product_id')
-    merged = merged.dropna(subset=['order_date', 'quantity', 'unit_price'])
 
-    monthly_sales = merged.groupby(['product_name', 'order_month']).agg({
-        'quantity': 'sum',
-        'unit_price': 'mean'
-    }).reset_index().rename(columns={'quantity': 'total_quantity'})
+    # Aylık ürün satışları (servis tarafındaki özellik deposu da aynı fonksiyonu kullanır)
+    return compute_monthly_sales(merged)
 
+# Aylık satış tablosundan eğitim özellikleri (gecikmeler, kodlar) pandas ile hesaplanır
+def build_training_frame(monthly_sales):
     df = monthly_sales.copy()
     df['order_month'] = pd.to_datetime(df['order_month'])
     df = df.sort_values(['product_name', 'order_month'])
@@ -63,10 +61,67 @@ def train_and_save_model():
     df['prev_month_sales'] = df.groupby('product_name')['total_quantity'].shift(1)
     df['sales_rolling_3'] = df.groupby('product_name')['total_quantity'].rolling(3).mean().shift(1).reset_index(0, drop=True)
     df = df.dropna(subset=['prev_month_sales', 'sales_rolling_3'])
+    return df
+
+# Aynı özellik tablosu tek bir PostgreSQL pencere fonksiyonu sorgusuyla veritabanında hesaplanır;
+# istemciye yalnızca son özellik matrisi gelir (ham sipariş satırları aktarılmaz).
+#   product_code     → ürün adlarının sıralı (COLLATE "C" = pandas sıralaması) benzersiz kodu
+#   prev_month_sales → LAG(total_quantity)                   (groupby().shift(1))
+#   sales_rolling_3  → önceki 3 satış ayının ortalaması      (rolling(3).mean().shift(1))
+#   month_rank > 3   → en az 3 aylık geçmişi olan satırlar   (dropna)
+TRAINING_FEATURES_QUERY = """
+    WITH monthly AS (
+        SELECT p.product_name,
+               DATE_TRUNC('month', o.order_date)::date AS order_month,
+               SUM(od.quantity) AS total_quantity,
+               AVG(p.unit_price) AS unit_price
+        FROM order_details od
+        JOIN orders o ON od.order_id = o.order_id
+        JOIN products p ON od.product_id = p.product_id
+        WHERE o.order_date IS NOT NULL AND od.quantity IS NOT NULL AND p.unit_price IS NOT NULL
+        GROUP BY p.product_name, DATE_TRUNC('month', o.order_date)
+    ),
+    features AS (
+        SELECT product_name, order_month, total_quantity, unit_price,
+               DENSE_RANK() OVER (ORDER BY product_name COLLATE "C") - 1 AS product_code,
+               TO_CHAR(order_month, 'YYYYMM')::int AS order_month_num,
+               EXTRACT(MONTH FROM order_month)::int AS month_only,
+               LAG(total_quantity) OVER w AS prev_month_sales,
+               AVG(total_quantity) OVER (w ROWS BETWEEN 3 PRECEDING AND 1 PRECEDING) AS sales_rolling_3,
+               ROW_NUMBER() OVER w AS month_rank
+        FROM monthly
+        WINDOW w AS (PARTITION BY product_name ORDER BY order_month)
+    )
+    SELECT product_name, order_month, total_quantity, unit_price, product_code,
+           order_month_num, month_only, prev_month_sales, sales_rolling_3
+    FROM features
+    WHERE month_rank > 3
+    ORDER BY product_name COLLATE "C", order_month
+"""
+
+def load_training_frame_sql():
+    df = pd.read_sql(TRAINING_FEATURES_QUERY, engine)
+    df['order_month'] = pd.to_datetime(df['order_month'])
+    return df
+
+# TRAIN_FEATURES_IN_SQL=1 ise özellikler veritabanında hesaplanır.
+# Aksi halde TRAIN_CHUNKSIZE > 0 ise sipariş satırları parça parça okunur ve yalnızca ürün × ay özeti bellekte tutulur.
+def train_and_save_model(chunksize=None, features_in_sql=None):
+    if chunksize is None:
+        chunksize = int(os.getenv("TRAIN_CHUNKSIZE", "0"))
+    if features_in_sql is None:
+        features_in_sql = os.getenv("TRAIN_FEATURES_IN_SQL", "0") == "1"
+
+    if features_in_sql:
+        df = load_training_frame_sql()
+    elif chunksize > 0:
+        df = build_training_frame(stream_monthly_sales(engine, chunksize=chunksize))
+    else:
+        df = build_training_frame(load_monthly_sales())
 
     # Kodu eşle ve kaydet
     product_code_map = df[['product_name', 'product_code']].drop_duplicates()
-    joblib.dump(dict(zip(product_code_map['product_name'], product_code_map['product_code'])), 'product_code_map.pkl')
+    atomic_dump(dict(zip(product_code_map['product_name'], product_code_map['product_code'])), 'product_code_map.pkl')
 
     # Korelasyon
     print("\n=== Korelasyon Matrisi ===")
@@ -84,7 +139,8 @@ def train_and_save_model():
     r2 = r2_score(y_test, y_pred)
     rmse = np.sqrt(mean_squared_error(y_test, y_pred))
 
-    joblib.dump(model, 'sales_model.pkl')
+    # Servisteki model kaydı sales_model.pkl'yi izler; en son ve tek adımda yazılır (yarım dosya görülmez)
+    atomic_dump(model, 'sales_model.pkl')
     print("Model başarıyla kaydedildi. R2:", r2, "RMSE:", rmse)
 
     return {
@@ -0,0 +1,22 @@
+import pandas as pd
+from app.features import date_features, parse_dates
+
+
+# Toplu tahmin tarihleri: ofsetli ve ofsetsiz ISO tarihler karışık gelse de (pandas "Mixed timezones detected")
+# her satır kendi yerel tarihine göre çözülmeli; çözülemeyen değer NaT olmalı (servis 400 döner)
+def test_parse_dates_mixed_offsets():
+    dates = parse_dates(["1997-05-03", "1997-06-01T10:00:00+03:00", "1997-07-31T23:30:00-05:00"])
+    assert dates.dt.tz is None
+    assert dates.tolist() == [pd.Timestamp("1997-05-03"), pd.Timestamp("1997-06-01 10:00"),
+                              pd.Timestamp("1997-07-31 23:30")]
+    assert date_features(dates)["month"].tolist() == [5, 6, 7]
+
+
+def test_parse_dates_offset_with_non_iso():
+    dates = parse_dates(["1997-05-03T00:00:00+03:00", "05/06/1997"])
+    assert dates.tolist() == [pd.Timestamp("1997-05-03"), pd.Timestamp("1997-05-06")]
+
+
+def test_parse_dates_invalid_values():
+    dates = parse_dates(["1997-01-02", "not-a-date", "", "1997-13-01"])
+    assert dates.isna().tolist() == [False, True, True, True]
@@ -0,0 +1,31 @@
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from app.flat_forest import FlatForest, export_model
+
+
+# Düzleştirilmiş orman, dışa aktarılıp bellek eşlemeli açıldığında sklearn ile aynı tahminleri vermeli
+def fitted_forest(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 100, size=(300, 9))
+    y = X[:, 0] * 3 + np.where(X[:, 4] > 50, 40.0, 0.0) + rng.normal(0, 5, size=len(X))
+    model = RandomForestRegressor(n_estimators=12, max_depth=8, random_state=0).fit(X, y)
+    model_path = tmp_path / "rf_model.pkl"
+    flat_path = tmp_path / "rf_model_flat.joblib"
+    joblib.dump(model, model_path)
+    export_model(model_path, flat_path)
+    return model, FlatForest.load(flat_path, mmap_mode="r")
+
+
+def test_flat_forest_matches_sklearn(tmp_path):
+    model, flat = fitted_forest(tmp_path)
+    X = np.random.default_rng(1).uniform(-10, 110, size=(500, 9))
+    assert isinstance(flat.value, np.memmap)
+    assert np.allclose(flat.predict(X), model.predict(X))
+    assert np.allclose(flat.predict(X[:1]), model.predict(X[:1]))
+
+
+def test_flat_forest_empty_input(tmp_path):
+    _, flat = fitted_forest(tmp_path)
+    predictions = flat.predict(np.empty((0, 9)))
+    assert predictions.shape == (0,)